@@ -1,21 +1,30 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Annotated
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from config import settings
 from database import get_db
+from password_hashing import PasswordHasher, PasswordHasherBusy
+from principal_cache import PrincipalCache, install_invalidation_hooks
 import models
 import schemas
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_queue)
 
 # JWT token handling
 security = HTTPBearer()
 
+# Resolved principals (User + role profile), keyed by token subject
+principal_cache = PrincipalCache(settings.principal_cache_max_entries, settings.principal_cache_ttl_seconds)
+install_invalidation_hooks(principal_cache)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -24,6 +33,28 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool without blocking the event loop."""
+    try:
+        return await password_hasher.run(verify_password, plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool without blocking the event loop."""
+    try:
+        return await password_hasher.run(get_password_hash, password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -38,6 +69,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token and return token data."""
+    return decode_access_token(credentials.credentials)
+
+def decode_access_token(token: str) -> schemas.TokenData:
+    """Decode a raw JWT (header or query-string token) into token data."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -45,34 +80,49 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     )
     
     try:
-        payload = jwt.decode(credentials.credentials, settings.secret_key, algorithms=[settings.algorithm])
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+        exp = payload.get("exp")
+        expires_at = datetime.fromtimestamp(exp, tz=timezone.utc) if exp is not None else None
+        token_data = schemas.TokenData(email=email, expires_at=expires_at)
     except JWTError:
         raise credentials_exception
     
     return token_data
 
-def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """Authenticate user with email and password."""
-    user = db.query(models.User).filter(models.User.email == email).first()
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    user = result.scalars().first()
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
-def get_current_user(db: Session = Depends(get_db), token_data: schemas.TokenData = Depends(verify_token)) -> models.User:
-    """Get current authenticated user."""
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+async def get_current_user(db: AsyncSession = Depends(get_db), token_data: schemas.TokenData = Depends(verify_token)) -> models.User:
+    """Get current authenticated user (with its patient/staff profile loaded)."""
+    email: str = token_data.email  # type: ignore
+    cached = principal_cache.get(email)
+    if cached is not None:
+        # Attach a private copy to this request's session without a round-trip.
+        return await db.merge(cached, load=False)
+
+    result = await db.execute(
+        select(models.User)
+        .options(joinedload(models.User.patient_profile), joinedload(models.User.staff_profile))
+        .where(models.User.email == email)
+    )
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    principal_cache.put(email, user, token_data.expires_at)
     return user
 
 def get_current_active_user(current_user: Annotated[models.User, Depends(get_current_user)]) -> models.User:
@@ -82,7 +132,6 @@ def get_current_active_user(current_user: Annotated[models.User, Depends(get_cur
     return current_user
 
 def get_current_patient(
-    db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
     """Return the patient profile for the logged-in user or raise if role mismatches."""
@@ -92,12 +141,28 @@ def get_current_patient(
             detail="Not enough permissions",
         )
 
-    patient = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+    patient: Optional[models.Patient] = current_user.patient_profile
     if patient is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
 
     return patient
 
+def get_current_staff(
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Return the staff profile for the logged-in user or raise if role mismatches."""
+    if current_user.role == models.UserRole.PATIENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+
+    staff: Optional[models.Staff] = current_user.staff_profile
+    if staff is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Staff profile not found")
+
+    return staff
+
 def require_role(allowed_roles: list):
     """Decorator to require specific user roles."""
     def role_checker(current_user: models.User = Depends(get_current_active_user)):
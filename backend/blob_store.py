@@ -0,0 +1,133 @@
+"""Content-addressed, reference-counted storage for uploaded media.
+
+Uploads are streamed to ``<upload_dir>/blobs/.staging`` on local disk while
+their SHA-256 is computed, then saved to the configured storage driver
+under the key ``<upload_dir>/blobs/ab/cd/<sha256><ext>``.
+A ``media_blobs`` row per file counts the ``VideoRecording`` rows pointing
+at it (matched by ``content_sha256``), so a re-submitted recording costs a
+counter increment instead of another full copy, and the file plus its
+derived poster/thumbnails are only unlinked when the last reference goes.
+
+Counter updates happen in the caller's transaction; files are moved into
+place before the row is written and removed only after the releasing
+transaction committed, so a failure can leave an unreferenced file behind
+but never a row without its file. On PostgreSQL ``store`` and
+``unlink_if_unreferenced`` also take a transaction-scoped advisory lock on
+the content hash: an upload holds it from before its file is saved until
+its row commits, and an unlink holds it from the "no row" check until
+the files are gone, so an unlink can never remove a file that a
+concurrent upload of the same content has just saved. (SQLite, used only
+for development, does not take the lock.)
+"""
+
+import logging
+import os
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import metrics
+import models
+from config import settings
+from database import is_postgres
+from media_processing import derived_image_paths
+from media_uploads import StoredUpload
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.path.join(settings.upload_dir, "blobs")
+STAGING_DIR = os.path.join(BLOB_DIR, ".staging")
+
+
+def blob_path(sha256: str, extension: str = "") -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], f"{sha256}{extension.lower()}")
+
+
+def is_blob_path(path: str) -> bool:
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(BLOB_DIR)]) == os.path.abspath(BLOB_DIR)
+
+
+async def _lock_content(db: AsyncSession, sha256: str) -> None:
+    """Serialise store/unlink of one content hash until the transaction ends."""
+    if is_postgres:
+        await db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:sha256))"), {"sha256": sha256})
+
+
+async def _add_reference(db: AsyncSession, sha256: str) -> Optional[str]:
+    result = await db.execute(
+        update(models.MediaBlob)
+        .where(models.MediaBlob.sha256 == sha256)
+        .values(ref_count=models.MediaBlob.ref_count + 1)
+        .returning(models.MediaBlob.path)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar()
+
+
+async def store(
+    db: AsyncSession, staged: StoredUpload, extension: str = "", content_type: Optional[str] = None
+) -> Tuple[str, bool]:
+    """Take a reference on the blob for ``staged`` and return ``(key, reused)``.
+
+    ``staged`` must live in ``STAGING_DIR``. If the content is already
+    stored the staged copy is dropped; otherwise it is saved to storage.
+    """
+    await _lock_content(db, staged.sha256)
+    existing = await _add_reference(db, staged.sha256)
+    if existing is not None:
+        os.remove(staged.path)
+        metrics.counter("blob_store.deduplicated_bytes").inc(staged.size)
+        return existing, True
+
+    path = blob_path(staged.sha256, extension)
+    await storage.save(staged.path, path, content_type)
+    try:
+        async with db.begin_nested():
+            db.add(models.MediaBlob(sha256=staged.sha256, path=path, size_bytes=staged.size, ref_count=1))
+    except IntegrityError:
+        # A concurrent upload of the same content created the row first.
+        existing = await _add_reference(db, staged.sha256)
+        return existing or path, True
+    metrics.counter("blob_store.stored_bytes").inc(staged.size)
+    return path, False
+
+
+async def release(db: AsyncSession, sha256: str) -> Optional[str]:
+    """Drop one reference; return the blob path if that was the last one."""
+    result = await db.execute(
+        update(models.MediaBlob)
+        .where(models.MediaBlob.sha256 == sha256, models.MediaBlob.ref_count > 0)
+        .values(ref_count=models.MediaBlob.ref_count - 1)
+        .returning(models.MediaBlob.ref_count, models.MediaBlob.path)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    if row is None or row.ref_count > 0:
+        return None
+    await db.execute(
+        delete(models.MediaBlob)
+        .where(models.MediaBlob.sha256 == sha256, models.MediaBlob.ref_count == 0)
+        .execution_options(synchronize_session=False)
+    )
+    return row.path
+
+
+async def unlink_if_unreferenced(db: AsyncSession, sha256: str, path: str) -> None:
+    """Remove a released blob and its derived images.
+
+    Call after the releasing transaction committed; this runs (and
+    commits) its own, holding the content lock until the files are gone.
+    """
+    await _lock_content(db, sha256)
+    try:
+        # A concurrent upload may have re-created the blob since it was released.
+        if await db.scalar(select(models.MediaBlob.id).where(models.MediaBlob.sha256 == sha256)):
+            return
+        for key in [path, *derived_image_paths(path)]:
+            await storage.delete(key)
+        metrics.counter("blob_store.unlinked").inc()
+    finally:
+        await db.commit()
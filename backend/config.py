@@ -10,11 +10,27 @@ class Settings(BaseSettings):
     
     # Database (Supabase PostgreSQL)
     database_url: str = os.getenv("DATABASE_URL", "")
-    
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
     # JWT Configuration
     secret_key: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     algorithm: str = os.getenv("ALGORITHM", "HS256")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+    # Password hashing pool (bcrypt runs off the event loop)
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    password_hash_max_queue: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+    # Authenticated principal cache (per worker; keep the TTL short since
+    # other workers only see user changes once their entry expires)
+    principal_cache_ttl_seconds: int = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+    principal_cache_max_entries: int = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+    # Real-time message push (per-connection queue bound and connection cap)
+    realtime_queue_size: int = int(os.getenv("REALTIME_QUEUE_SIZE", "100"))
+    realtime_max_connections_per_user: int = int(os.getenv("REALTIME_MAX_CONNECTIONS_PER_USER", "5"))
+    read_receipt_window_ms: int = int(os.getenv("READ_RECEIPT_WINDOW_MS", "250"))
     
     # CORS Configuration
     # Note: FastAPI CORS doesn't support wildcards, so we allow all in production
@@ -32,6 +48,45 @@ class Settings(BaseSettings):
     # File Upload Configuration
     max_file_size: int = int(os.getenv("MAX_FILE_SIZE", str(10 * 1024 * 1024)))  # 10MB
     upload_dir: str = os.getenv("UPLOAD_DIR", "uploads")
+    upload_chunk_size: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1MB
+    upload_session_ttl_hours: int = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+    media_processing_workers: int = int(os.getenv("MEDIA_PROCESSING_WORKERS", "2"))
+    patient_storage_quota_bytes: int = int(os.getenv("PATIENT_STORAGE_QUOTA_BYTES", "0"))  # 0 = unlimited
+    
+    # Media Storage ("local" or "s3" for any S3-compatible service such as MinIO)
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "local").lower()
+    s3_bucket: str = os.getenv("S3_BUCKET", "")
+    s3_endpoint_url: str = os.getenv("S3_ENDPOINT_URL", "")
+    s3_region: str = os.getenv("S3_REGION", "")
+    s3_access_key_id: str = os.getenv("S3_ACCESS_KEY_ID", "")
+    s3_secret_access_key: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    s3_presign_ttl_seconds: int = int(os.getenv("S3_PRESIGN_TTL_SECONDS", "300"))
+    s3_max_pool_connections: int = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20"))
+    s3_multipart_chunk_mb: int = int(os.getenv("S3_MULTIPART_CHUNK_MB", "8"))
+    
+    # Media Sweeper (quarantines unreferenced files, reports rows with missing files)
+    media_sweep_enabled: bool = os.getenv("MEDIA_SWEEP_ENABLED", "false").lower() == "true"
+    media_sweep_interval_minutes: int = int(os.getenv("MEDIA_SWEEP_INTERVAL_MINUTES", "360"))
+    media_sweep_grace_hours: int = int(os.getenv("MEDIA_SWEEP_GRACE_HOURS", "24"))
+    media_sweep_rate: float = float(os.getenv("MEDIA_SWEEP_RATE", "200"))  # entries per second
+    media_sweep_batch_size: int = int(os.getenv("MEDIA_SWEEP_BATCH_SIZE", "100"))
+    
+    # Face Matching (IVF index once this many encodings are enrolled; 0 = always exact)
+    face_ann_min_size: int = int(os.getenv("FACE_ANN_MIN_SIZE", "20000"))
+    face_ann_nprobe: int = int(os.getenv("FACE_ANN_NPROBE", "8"))
+    face_index_path: str = os.getenv("FACE_INDEX_PATH", "face_index.npz")
+    face_match_threshold: float = float(os.getenv("FACE_MATCH_THRESHOLD", "0.6"))
+    face_match_top_k: int = int(os.getenv("FACE_MATCH_TOP_K", "5"))
+    
+    # Face Detection Pipeline (worker processes running face_recognition/dlib)
+    face_pipeline_workers: int = int(os.getenv("FACE_PIPELINE_WORKERS", str(min(2, os.cpu_count() or 1))))
+    face_pipeline_max_queue: int = int(os.getenv("FACE_PIPELINE_MAX_QUEUE", "16"))
+    face_image_max_bytes: int = int(os.getenv("FACE_IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))  # 5MB
+    face_image_max_pixels: int = int(os.getenv("FACE_IMAGE_MAX_PIXELS", str(40_000_000)))
+    face_image_max_side: int = int(os.getenv("FACE_IMAGE_MAX_SIDE", "800"))
+    face_detection_model: str = os.getenv("FACE_DETECTION_MODEL", "hog")  # "hog" or "cnn"
+    face_detection_upsample: int = int(os.getenv("FACE_DETECTION_UPSAMPLE", "1"))
+    face_batch_max_items: int = int(os.getenv("FACE_BATCH_MAX_ITEMS", "32"))
     
     # API Configuration
     api_version: str = "v1"
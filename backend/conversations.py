@@ -0,0 +1,150 @@
+"""Maintenance of the materialized conversation summaries.
+
+``conversations`` holds one row per direct-message pair or group with the
+latest message, and ``conversation_participants`` one row per member with
+its unread counter. Both are updated inside the same transaction as the
+message write or read they describe, so the conversation list can be read
+without scanning ``messages``.
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import case, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+import models
+
+
+def direct_key(user_a: int, user_b: int) -> str:
+    low, high = sorted((user_a, user_b))
+    return f"dm:{low}:{high}"
+
+
+def group_key(group_id: int) -> str:
+    return f"group:{group_id}"
+
+
+def message_key(message: models.Message) -> str:
+    """Conversation key a message belongs to."""
+    if message.group_id is not None:
+        return group_key(message.group_id)  # type: ignore
+    return direct_key(message.sender_id, message.recipient_id)  # type: ignore
+
+
+async def get_or_create_conversation(
+    db: AsyncSession, key: str, group_id: Optional[int] = None
+) -> models.Conversation:
+    result = await db.execute(select(models.Conversation).where(models.Conversation.conversation_key == key))
+    conversation = result.scalars().first()
+    if conversation is not None:
+        return conversation
+    try:
+        async with db.begin_nested():
+            conversation = models.Conversation(conversation_key=key, group_id=group_id)
+            db.add(conversation)
+    except IntegrityError:
+        # Another request created it concurrently.
+        result = await db.execute(select(models.Conversation).where(models.Conversation.conversation_key == key))
+        conversation = result.scalars().one()
+    return conversation
+
+
+async def record_message(db: AsyncSession, message: models.Message, participant_ids: Iterable[int]) -> None:
+    """Point the conversation at ``message`` and bump unread counts.
+
+    ``message`` must already be flushed. ``participant_ids`` are the users
+    who can see it (both ends of a DM, or the group's current members);
+    everyone except the sender gets one more unread message.
+    """
+    participant_ids = set(participant_ids)
+    sender_id: int = message.sender_id  # type: ignore
+    conversation = await get_or_create_conversation(db, message_key(message), message.group_id)  # type: ignore
+    conversation.last_message_id = message.id
+    conversation.last_message_at = func.now()
+
+    result = await db.execute(
+        select(models.ConversationParticipant.user_id).where(
+            models.ConversationParticipant.conversation_id == conversation.id
+        )
+    )
+    missing = participant_ids - set(result.scalars().all())
+    for user_id in missing:
+        peer_user_id = None
+        if message.group_id is None:
+            peer_user_id = message.recipient_id if user_id == sender_id else sender_id
+        try:
+            async with db.begin_nested():
+                db.add(models.ConversationParticipant(
+                    conversation_id=conversation.id,
+                    user_id=user_id,
+                    peer_user_id=peer_user_id,
+                    unread_count=0,
+                ))
+        except IntegrityError:
+            # Another request's first message added this participant concurrently.
+            pass
+
+    participant = models.ConversationParticipant
+    await db.execute(
+        update(participant)
+        .where(participant.conversation_id == conversation.id, participant.user_id.in_(participant_ids))
+        .values(
+            unread_count=participant.unread_count + case((participant.user_id != sender_id, 1), else_=0),
+            last_message_at=func.now(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _advance_last_read(up_to_message_id: int):
+    participant = models.ConversationParticipant
+    return case(
+        (or_(participant.last_read_message_id.is_(None), participant.last_read_message_id < up_to_message_id), up_to_message_id),
+        else_=participant.last_read_message_id,
+    )
+
+
+def _conversation_id(key: str):
+    return select(models.Conversation.id).where(
+        models.Conversation.conversation_key == key
+    ).scalar_subquery()
+
+
+async def mark_read(db: AsyncSession, user_id: int, key: str, read_count: int, up_to_message_id: int) -> None:
+    """Subtract ``read_count`` newly-read messages from ``user_id``'s counter."""
+    participant = models.ConversationParticipant
+    await db.execute(
+        update(participant)
+        .where(participant.conversation_id == _conversation_id(key), participant.user_id == user_id)
+        .values(
+            unread_count=case((participant.unread_count > read_count, participant.unread_count - read_count), else_=0),
+            last_read_message_id=_advance_last_read(up_to_message_id),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def set_unread(db: AsyncSession, user_id: int, key: str, unread_count: int, up_to_message_id: int) -> None:
+    """Overwrite ``user_id``'s counter with a freshly computed value."""
+    participant = models.ConversationParticipant
+    await db.execute(
+        update(participant)
+        .where(participant.conversation_id == _conversation_id(key), participant.user_id == user_id)
+        .values(
+            unread_count=unread_count,
+            last_read_message_id=_advance_last_read(up_to_message_id),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def remove_participant(db: AsyncSession, user_id: int, key: str) -> None:
+    """Drop ``user_id`` from a conversation's summary (e.g. on leaving a group)."""
+    participant = models.ConversationParticipant
+    await db.execute(
+        delete(participant)
+        .where(participant.conversation_id == _conversation_id(key), participant.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
@@ -13,11 +14,23 @@ if not database_url:
     database_url = "sqlite:///./serenity_rehab.db"
     print("Warning: No DATABASE_URL provided, using SQLite for development")
 
+is_postgres = database_url.startswith("postgresql://") or database_url.startswith("postgres://")
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver (asyncpg / aiosqlite)."""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
 # Create engine with appropriate configuration
-if database_url.startswith("postgresql://") or database_url.startswith("postgres://"):
+if is_postgres:
     # PostgreSQL configuration for Supabase
     engine = create_engine(
-        database_url,
+        database_url.replace("postgres://", "postgresql://", 1),
         pool_pre_ping=True,
         pool_recycle=300,
         echo=settings.debug,
@@ -26,6 +39,19 @@ if database_url.startswith("postgresql://") or database_url.startswith("postgres
             "options": "-c timezone=utc"
         } if "supabase" in database_url.lower() else {}
     )
+    # Async engine used by the request handlers; asyncpg takes server
+    # settings instead of a libpq options string.
+    async_engine = create_async_engine(
+        to_async_url(database_url),
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        echo=settings.debug,
+        connect_args={
+            "server_settings": {"timezone": "utc"}
+        } if "supabase" in database_url.lower() else {}
+    )
     print("Using Supabase PostgreSQL database")
 else:
     # SQLite configuration for development
@@ -34,29 +60,38 @@ else:
         connect_args={"check_same_thread": False} if "sqlite" in database_url else {},
         echo=settings.debug
     )
+    async_engine = create_async_engine(
+        to_async_url(database_url),
+        echo=settings.debug
+    )
     print("Warning: Using SQLite for development")
 
-# Create SessionLocal class
+# Create SessionLocal class (sync; used by scripts and startup tasks)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async session factory used by the API. Objects stay usable after commit so
+# handlers can return them without triggering a lazy refresh.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # Create Base class
 Base = declarative_base()
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Health check function
-def check_database_connection():
+async def check_database_connection():
     """Check if database connection is working"""
     try:
-        with engine.connect() as connection:
-            from sqlalchemy import text
-            connection.execute(text("SELECT 1"))
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
         return True
     except Exception as e:
         print(f"Error: Database connection failed: {e}")
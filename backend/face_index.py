@@ -0,0 +1,204 @@
+"""Approximate nearest-neighbour search over face encodings (NumPy only).
+
+``IVFIndex`` is an inverted-file index: k-means splits the encodings into
+``nlist`` cells, each vector is stored in the list of its nearest
+centroid, and a query only scans the lists of its ``nprobe`` nearest
+centroids, about ``nprobe / nlist`` of the data. Vectors stay float32 and
+distances within the probed lists are exact, so whatever is found is
+ranked correctly; recall is traded only through ``nprobe``. Adds and
+removes touch one list (removal swaps the last entry into the gap), and
+``save``/``load`` round-trip the whole index through a single ``.npz`` so
+a restart skips training. Centroids are not retrained as data arrives;
+rebuild the index once it has grown well past ``trained_size``.
+``scripts/benchmark_face_index.py`` measures recall and latency against
+exact search.
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rows scored against the centroids at once while assigning vectors.
+_ASSIGN_CHUNK = 8192
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        chunk = vectors[start:start + _ASSIGN_CHUNK]
+        # |x|^2 is the same for every centroid, so it can be left out of the argmin.
+        assignment[start:start + len(chunk)] = np.argmin(centroid_norms[None, :] - 2.0 * (chunk @ centroids.T), axis=1)
+    return assignment
+
+
+def train_centroids(
+    vectors: np.ndarray, nlist: int, iterations: int = 20, sample_size: int = 256, seed: int = 0
+) -> np.ndarray:
+    """Run k-means on up to ``sample_size * nlist`` of ``vectors``."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) > sample_size * nlist:
+        vectors = vectors[rng.choice(len(vectors), sample_size * nlist, replace=False)]
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroid(vectors, centroids)
+        counts = np.bincount(assignment, minlength=nlist)
+        sums = np.stack(
+            [np.bincount(assignment, weights=vectors[:, j], minlength=nlist) for j in range(vectors.shape[1])],
+            axis=1,
+        )
+        filled = counts > 0
+        centroids[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+        empty = np.flatnonzero(~filled)
+        if empty.size:
+            # Restart empty cells on random points so no centroid is wasted.
+            centroids[empty] = vectors[rng.choice(len(vectors), empty.size, replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, nprobe: int = 8, trained_size: int = 0):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        self.trained_size = trained_size
+        dimensions = self.centroids.shape[1]
+        self._vectors: List[np.ndarray] = [np.zeros((0, dimensions), dtype=np.float32) for _ in range(self.nlist)]
+        self._norms: List[np.ndarray] = [np.zeros(0, dtype=np.float32) for _ in range(self.nlist)]
+        self._ids: List[np.ndarray] = [np.zeros(0, dtype=np.int64) for _ in range(self.nlist)]
+        self._sizes = np.zeros(self.nlist, dtype=np.int64)
+        self._location: Dict[int, Tuple[int, int]] = {}
+
+    @classmethod
+    def build(cls, ids: Sequence[int], vectors: np.ndarray, nlist: Optional[int] = None, nprobe: int = 8) -> "IVFIndex":
+        """Train centroids on ``vectors`` and add them all."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(len(vectors))))
+        index = cls(train_centroids(vectors, nlist), nprobe=nprobe, trained_size=len(vectors))
+        index.add(ids, vectors)
+        return index
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def dimensions(self) -> int:
+        return self.centroids.shape[1]
+
+    def __len__(self) -> int:
+        return len(self._location)
+
+    def __contains__(self, vector_id: int) -> bool:
+        return vector_id in self._location
+
+    def vector(self, vector_id: int) -> np.ndarray:
+        cell, position = self._location[vector_id]
+        return self._vectors[cell][position]
+
+    def ids(self) -> np.ndarray:
+        return np.fromiter(self._location.keys(), dtype=np.int64, count=len(self._location))
+
+    def _append(self, cell: int, vector_id: int, vector: np.ndarray) -> None:
+        size = int(self._sizes[cell])
+        if size == len(self._ids[cell]):
+            capacity = max(16, size * 2)
+            for store in (self._vectors, self._norms, self._ids):
+                old = store[cell]
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:size] = old[:size]
+                store[cell] = new
+        self._vectors[cell][size] = vector
+        self._norms[cell][size] = vector @ vector
+        self._ids[cell][size] = vector_id
+        self._sizes[cell] = size + 1
+        self._location[vector_id] = (cell, size)
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray) -> None:
+        """Add (or replace) vectors under the given ids."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimensions)
+        cells = _nearest_centroid(vectors, self.centroids)
+        for vector_id, vector, cell in zip(ids, vectors, cells):
+            vector_id = int(vector_id)
+            if vector_id in self._location:
+                self.remove([vector_id])
+            self._append(int(cell), vector_id, vector)
+
+    def remove(self, ids: Sequence[int]) -> None:
+        for vector_id in ids:
+            location = self._location.pop(int(vector_id), None)
+            if location is None:
+                continue
+            cell, position = location
+            last = int(self._sizes[cell]) - 1
+            if position != last:
+                for store in (self._vectors, self._norms, self._ids):
+                    store[cell][position] = store[cell][last]
+                self._location[int(self._ids[cell][position])] = (cell, position)
+            self._sizes[cell] = last
+
+    def search(
+        self, queries: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """``(ids, distances)`` of the ``k`` nearest stored vectors per query, closest first."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimensions)
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        coarse = centroid_norms[None, :] - 2.0 * (queries @ self.centroids.T)
+        if nprobe < self.nlist:
+            probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), coarse.shape)
+
+        results = []
+        for query, cells in zip(queries, probes):
+            cells = [cell for cell in cells if self._sizes[cell]]
+            if not cells:
+                results.append((np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)))
+                continue
+            vectors = np.concatenate([self._vectors[c][:self._sizes[c]] for c in cells])
+            norms = np.concatenate([self._norms[c][:self._sizes[c]] for c in cells])
+            ids = np.concatenate([self._ids[c][:self._sizes[c]] for c in cells])
+            squared = norms - 2.0 * (vectors @ query) + query @ query
+            if len(squared) > k:
+                top = np.argpartition(squared, k - 1)[:k]
+            else:
+                top = np.arange(len(squared))
+            top = top[np.argsort(squared[top], kind="stable")]
+            results.append((ids[top], np.sqrt(np.maximum(squared[top], 0.0))))
+        return results
+
+    def save(self, path: str) -> None:
+        """Write the index to ``path`` (an ``.npz`` file) atomically."""
+        sizes = self._sizes
+        temp_path = f"{path}.tmp.npz"
+        np.savez(
+            temp_path,
+            centroids=self.centroids,
+            nprobe=np.int64(self.nprobe),
+            trained_size=np.int64(self.trained_size),
+            sizes=sizes,
+            ids=np.concatenate([self._ids[c][:sizes[c]] for c in range(self.nlist)]),
+            vectors=np.concatenate([self._vectors[c][:sizes[c]] for c in range(self.nlist)]),
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            index = cls(data["centroids"], nprobe=int(data["nprobe"]), trained_size=int(data["trained_size"]))
+            sizes, ids, vectors = data["sizes"], data["ids"], data["vectors"]
+        # Lists are stored back to back in cell order; no reassignment needed.
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        for cell in range(index.nlist):
+            start, end = int(offsets[cell]), int(offsets[cell + 1])
+            index._vectors[cell] = vectors[start:end].copy()
+            index._norms[cell] = np.einsum("ij,ij->i", index._vectors[cell], index._vectors[cell])
+            index._ids[cell] = ids[start:end].copy()
+            index._sizes[cell] = end - start
+            for position, vector_id in enumerate(index._ids[cell].tolist()):
+                index._location[vector_id] = (cell, position)
+        return index
@@ -0,0 +1,430 @@
+"""In-memory 1:N matching over the active face encodings.
+
+Every active ``FaceEncoding`` is held as one row of a contiguous float32
+matrix, with parallel arrays of encoding, user and patient ids and the
+rows' squared norms. A query (or a batch of queries) is compared with all
+of them in a single matrix product using
+``|a - b|^2 = |a|^2 - 2 a.b + |b|^2``, and the ``k`` closest rows within the
+threshold are picked with ``argpartition``. Distances are Euclidean, the
+measure ``face_recognition`` uses, so a lower distance is a closer match
+and ``threshold`` plays the role of its ``tolerance``; confidence is
+reported as ``1 - distance``.
+
+The matrix is loaded from the database on first use and then kept in step
+with ORM changes to ``FaceEncoding``: rows enrolled, updated or
+deactivated in a session are applied in place once that session commits,
+so matching never reparses the table. Changes made by other processes or
+by bulk ``UPDATE`` statements are only seen after ``invalidate()``.
+
+Once ``ann_min_size`` encodings are enrolled, unrestricted 1:N searches go
+through an ``IVFIndex`` (see ``face_index``) kept in step with the matrix
+instead of scanning every row. It is saved to ``index_path`` and reused
+on the next start, topped up with whatever changed in between, and
+retrained once the data has grown to four times what it was trained on.
+Training, loading and saving the index happen in a worker thread on a
+copy of the matrix; until the index is ready searches scan the matrix
+exactly (or keep using the previous index during a retrain), and changes
+committed meanwhile are replayed onto it before it is put in service.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import metrics
+import models
+from config import settings
+from face_index import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+# Stands in for a NULL patient id in the int64 id arrays.
+NO_PATIENT = -1
+# On-disk layout of FaceEncoding.encoding (see models.pack_encoding).
+ENCODING_DTYPE = np.dtype("<f4")
+_PENDING_KEY = "face_encoding_changes"
+
+
+@dataclass
+class FaceMatch:
+    encoding_id: int
+    user_id: int
+    patient_id: Optional[int]
+    distance: float
+
+    @property
+    def confidence(self) -> float:
+        return max(0.0, 1.0 - self.distance)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "encoding_id": self.encoding_id,
+            "user_id": self.user_id,
+            "patient_id": self.patient_id,
+            "distance": round(self.distance, 4),
+            "confidence": round(self.confidence, 4),
+        }
+
+
+class FaceMatcher:
+    def __init__(
+        self,
+        initial_capacity: int = 1024,
+        ann_min_size: int = 0,
+        nprobe: int = 8,
+        index_path: Optional[str] = None,
+    ):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self.ann_min_size = ann_min_size
+        self.nprobe = nprobe
+        self.index_path = index_path
+        self._ann: Optional[IVFIndex] = None
+        # Bumped on every reload so a build started before it is discarded.
+        self._generation = 0
+        self._index_pending = False
+        self._index_dirty: Set[int] = set()
+        self._index_task: Optional[asyncio.Task] = None
+        self._loaded = False
+        self._reset(0)
+        self._latency = metrics.latency("face_matching.latency")
+
+    def _reset(self, dimensions: int, capacity: int = 0) -> None:
+        capacity = max(capacity, self._initial_capacity)
+        self.dimensions = dimensions
+        self._size = 0
+        self._matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._encoding_ids = np.zeros(capacity, dtype=np.int64)
+        self._user_ids = np.zeros(capacity, dtype=np.int64)
+        self._patient_ids = np.zeros(capacity, dtype=np.int64)
+        self._row_of: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def invalidate(self) -> None:
+        """Forget the matrix; the next ``ensure_loaded`` reads it again."""
+        with self._lock:
+            self._loaded = False
+            self._ann = None
+            self._generation += 1
+            self._index_pending = False
+            self._reset(0)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        if self._loaded:
+            return
+        result = await db.execute(
+            select(
+                models.FaceEncoding.id,
+                models.FaceEncoding.user_id,
+                models.FaceEncoding.patient_id,
+                models.FaceEncoding.encoding,
+            ).where(models.FaceEncoding.is_active.is_(True))
+        )
+        rows = result.all()
+        # The most common blob length, so one malformed row cannot set the width.
+        widths = Counter(len(row.encoding) for row in rows
+                         if row.encoding and len(row.encoding) % ENCODING_DTYPE.itemsize == 0)
+        width = widths.most_common(1)[0][0] if widths else 0
+        valid = [row for row in rows if len(row.encoding) == width]
+        if len(valid) < len(rows):
+            logger.warning("Skipping %d face encodings not %d bytes long", len(rows) - len(valid), width)
+        # One buffer for all rows, viewed as an (n, d) matrix without copying.
+        vectors = np.frombuffer(b"".join(row.encoding for row in valid), dtype=ENCODING_DTYPE)
+        self.load_arrays(
+            np.fromiter((row.id for row in valid), dtype=np.int64, count=len(valid)),
+            np.fromiter((row.user_id for row in valid), dtype=np.int64, count=len(valid)),
+            np.fromiter((NO_PATIENT if row.patient_id is None else row.patient_id for row in valid),
+                        dtype=np.int64, count=len(valid)),
+            vectors.reshape(len(valid), width // ENCODING_DTYPE.itemsize),
+        )
+
+    def load(self, rows: Sequence[Tuple[int, int, Optional[int], Sequence[float]]]) -> None:
+        """Replace the matrix with ``(encoding_id, user_id, patient_id, encoding)`` rows."""
+        self.load_arrays(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype=np.int64),
+            np.array([NO_PATIENT if row[2] is None else row[2] for row in rows], dtype=np.int64),
+            np.array([row[3] for row in rows], dtype=np.float32).reshape(len(rows), -1 if rows else 0),
+        )
+
+    def load_arrays(
+        self, encoding_ids: np.ndarray, user_ids: np.ndarray, patient_ids: np.ndarray, vectors: np.ndarray
+    ) -> None:
+        """Replace the matrix with parallel arrays (``NO_PATIENT`` for missing patient ids)."""
+        size = len(encoding_ids)
+        with self._lock:
+            self._reset(vectors.shape[1] if size else 0, size)
+            self._matrix[:size] = vectors
+            self._norms[:size] = np.einsum("ij,ij->i", self._matrix[:size], self._matrix[:size])
+            self._encoding_ids[:size] = encoding_ids
+            self._user_ids[:size] = user_ids
+            self._patient_ids[:size] = patient_ids
+            self._row_of = {encoding_id: row for row, encoding_id in enumerate(encoding_ids.tolist())}
+            self._size = size
+            self._loaded = True
+            self._ann = None
+            self._generation += 1
+            self._index_pending = False
+            if self.ann_min_size and self._size >= self.ann_min_size:
+                self._schedule_index()
+        metrics.counter("face_matching.loads").inc()
+        logger.info("Loaded %d face encodings into the matcher", self._size)
+
+    def _grow(self) -> None:
+        capacity = max(self._initial_capacity, len(self._matrix) * 2)
+        for name in ("_matrix", "_norms", "_encoding_ids", "_user_ids", "_patient_ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _upsert(self, encoding_id: int, user_id: int, patient_id: Optional[int], encoding: Sequence[float]) -> None:
+        vector = np.asarray(encoding, dtype=np.float32)
+        if self.dimensions == 0 and self._size == 0:
+            self._reset(len(vector), len(self._matrix))
+        if vector.shape != (self.dimensions,):
+            logger.warning("Skipping face encoding %s with %d dimensions (expected %d)",
+                           encoding_id, vector.size, self.dimensions)
+            return
+        row = self._row_of.get(encoding_id)
+        if row is None:
+            if self._size == len(self._matrix):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._row_of[encoding_id] = row
+        self._matrix[row] = vector
+        self._norms[row] = vector @ vector
+        self._encoding_ids[row] = encoding_id
+        self._user_ids[row] = user_id
+        self._patient_ids[row] = NO_PATIENT if patient_id is None else patient_id
+
+    def _remove(self, encoding_id: int) -> None:
+        row = self._row_of.pop(encoding_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            # Keep the live rows contiguous by moving the last one into the gap.
+            for array in (self._matrix, self._norms, self._encoding_ids, self._user_ids, self._patient_ids):
+                array[row] = array[last]
+            self._row_of[int(self._encoding_ids[row])] = row
+        self._size = last
+
+    def apply(self, changes: Sequence[Tuple[int, int, Optional[int], Optional[Sequence[float]], bool]]) -> None:
+        """Apply committed ``(encoding_id, user_id, patient_id, encoding, active)`` changes."""
+        with self._lock:
+            if not self._loaded:
+                return
+            for encoding_id, user_id, patient_id, encoding, active in changes:
+                if self._index_pending:
+                    self._index_dirty.add(encoding_id)
+                if active and encoding is not None:
+                    self._upsert(encoding_id, user_id, patient_id, encoding)
+                    if self._ann is not None and encoding_id in self._row_of:
+                        self._ann.add([encoding_id], self._matrix[self._row_of[encoding_id]][None, :])
+                else:
+                    self._remove(encoding_id)
+                    if self._ann is not None:
+                        self._ann.remove([encoding_id])
+
+    def _schedule_index(self) -> None:
+        """Start building the IVF index from a copy of the matrix (caller holds the lock).
+
+        Inside an event loop the work runs in a thread and exact search
+        serves until it is done; without one (scripts) it runs inline.
+        """
+        if self._index_pending:
+            return
+        self._index_pending = True
+        self._index_dirty = set()
+        generation = self._generation
+        ids = self._encoding_ids[:self._size].copy()
+        vectors = self._matrix[:self._size].copy()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._finish_index(generation, self._build_index(ids, vectors))
+            return
+        self._index_task = loop.create_task(self._build_in_thread(generation, ids, vectors))
+
+    async def _build_in_thread(self, generation: int, ids: np.ndarray, vectors: np.ndarray) -> None:
+        try:
+            index = await asyncio.to_thread(self._build_index, ids, vectors)
+        except Exception:
+            logger.exception("Building the face index failed; exact search stays in use")
+            with self._lock:
+                if generation == self._generation:
+                    self._index_pending = False
+            return
+        self._finish_index(generation, index)
+
+    def _build_index(self, ids: np.ndarray, vectors: np.ndarray) -> IVFIndex:
+        """Reuse the saved IVF index if it fits ``vectors``, else train a new one. Takes no lock."""
+        index = None
+        if self.index_path and os.path.exists(self.index_path):
+            try:
+                index = IVFIndex.load(self.index_path)
+            except (OSError, ValueError, KeyError):
+                logger.warning("Ignoring unreadable face index %s", self.index_path, exc_info=True)
+        if index is not None and (index.dimensions != vectors.shape[1] or len(ids) > 4 * index.trained_size):
+            index = None
+
+        started = time.perf_counter()
+        if index is None:
+            index = IVFIndex.build(ids, vectors, nprobe=self.nprobe)
+            metrics.counter("face_matching.index_builds").inc()
+        else:
+            # Warm start: drop rows that went away, add rows that are new or changed.
+            current = set(ids.tolist())
+            index.remove([i for i in index.ids().tolist() if i not in current])
+            stale = [row for row, i in enumerate(ids.tolist())
+                     if i not in index or not np.array_equal(index.vector(i), vectors[row])]
+            if stale:
+                index.add(ids[stale], vectors[stale])
+        logger.info("Face index ready with %d encodings in %d lists (%.2fs)",
+                    len(index), index.nlist, time.perf_counter() - started)
+        if self.index_path:
+            # Not shared yet, so it can be written without the lock.
+            index.save(self.index_path)
+        return index
+
+    def _finish_index(self, generation: int, index: IVFIndex) -> None:
+        """Replay changes committed during the build, then put ``index`` in service."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            for encoding_id in self._index_dirty:
+                row = self._row_of.get(encoding_id)
+                if row is None:
+                    index.remove([encoding_id])
+                else:
+                    index.add([encoding_id], self._matrix[row][None, :])
+            self._index_dirty = set()
+            self._index_pending = False
+            self._ann = index
+
+    def save_index(self) -> None:
+        with self._lock:
+            if self._ann is not None and self.index_path:
+                self._ann.save(self.index_path)
+
+    def match_many(
+        self,
+        queries: Sequence[Sequence[float]],
+        threshold: float,
+        k: int = 5,
+        user_ids: Optional[Sequence[Optional[int]]] = None,
+        patient_ids: Optional[Sequence[Optional[int]]] = None,
+    ) -> List[List[FaceMatch]]:
+        """Top ``k`` matches within ``threshold`` for each query, closest first.
+
+        ``user_ids``/``patient_ids`` optionally restrict each query to the
+        encodings of one claimed user or patient (1:1 verification).
+        """
+        if len(queries) == 0:
+            return []
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return [[] for _ in queries]
+            q = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+            if q.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions}-dimensional encodings, got {q.shape[1]}")
+            started = time.perf_counter()
+            use_ann = user_ids is None and patient_ids is None and self.ann_min_size and size >= self.ann_min_size
+            if use_ann and (self._ann is None or size > 4 * self._ann.trained_size):
+                self._schedule_index()
+            if use_ann and self._ann is not None:
+                results = [
+                    [self._match_at(self._row_of[int(i)], float(d)) for i, d in zip(found, distances) if d <= threshold]
+                    for found, distances in self._ann.search(q, k)  # type: ignore[union-attr]
+                ]
+                self._latency.observe(time.perf_counter() - started)
+                metrics.counter("face_matching.queries").inc(len(queries))
+                return results
+            matrix = self._matrix[:size]
+            squared = self._norms[:size][None, :] - 2.0 * (q @ matrix.T) + np.einsum("ij,ij->i", q, q)[:, None]
+            distances = np.sqrt(np.maximum(squared, 0.0, out=squared), out=squared)
+            for claimed_ids, row_ids in ((user_ids, self._user_ids), (patient_ids, self._patient_ids)):
+                if claimed_ids is None:
+                    continue
+                claimed = np.array([NO_PATIENT if i is None else i for i in claimed_ids], dtype=np.int64)[:, None]
+                distances[(claimed != NO_PATIENT) & (row_ids[:size][None, :] != claimed)] = np.inf
+            results = [self._top_k(row, threshold, k) for row in distances]
+            self._latency.observe(time.perf_counter() - started)
+        metrics.counter("face_matching.queries").inc(len(queries))
+        return results
+
+    def match(self, query: Sequence[float], threshold: float, k: int = 5) -> List[FaceMatch]:
+        return self.match_many([query], threshold, k)[0]
+
+    def _top_k(self, distances: np.ndarray, threshold: float, k: int) -> List[FaceMatch]:
+        candidates = np.flatnonzero(distances <= threshold)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [self._match_at(row, float(distances[row])) for row in candidates]
+
+    def _match_at(self, row: int, distance: float) -> FaceMatch:
+        return FaceMatch(
+            encoding_id=int(self._encoding_ids[row]),
+            user_id=int(self._user_ids[row]),
+            patient_id=None if self._patient_ids[row] == NO_PATIENT else int(self._patient_ids[row]),
+            distance=distance,
+        )
+
+
+def install_refresh_hooks(matcher: FaceMatcher) -> None:
+    """Apply ``FaceEncoding`` changes to ``matcher`` when their session commits."""
+
+    def on_after_flush(session, flush_context):
+        changes = [
+            (obj.id, obj.user_id, obj.patient_id, np.frombuffer(obj.encoding, dtype=ENCODING_DTYPE), bool(obj.is_active))
+            for obj in (*session.new, *session.dirty)
+            if isinstance(obj, models.FaceEncoding)
+        ]
+        changes += [
+            (obj.id, obj.user_id, obj.patient_id, None, False)
+            for obj in session.deleted
+            if isinstance(obj, models.FaceEncoding)
+        ]
+        if changes:
+            session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+    def on_after_commit(session):
+        changes = session.info.pop(_PENDING_KEY, None)
+        if changes:
+            matcher.apply(changes)
+
+    def on_after_rollback(session):
+        session.info.pop(_PENDING_KEY, None)
+
+    event.listen(Session, "after_flush", on_after_flush)
+    event.listen(Session, "after_commit", on_after_commit)
+    event.listen(Session, "after_rollback", on_after_rollback)
+
+
+face_matcher = FaceMatcher(
+    ann_min_size=settings.face_ann_min_size,
+    nprobe=settings.face_ann_nprobe,
+    index_path=settings.face_index_path,
+)
+install_refresh_hooks(face_matcher)
@@ -0,0 +1,328 @@
+"""Face detection and encoding of base64 images in worker processes.
+
+dlib's detector and encoder are CPU-bound and hold the GIL, so they run
+in a process pool whose workers import ``face_recognition`` (loading its
+models) once when they start. Each job takes the base64 payload, decodes
+it in chunks, reads just the image header to enforce the pixel limit,
+lets libjpeg decode straight to a reduced size where it can and then
+downsamples to ``max_side`` before detection. Payload size is checked in
+the web process from the string length alone, so oversized images never
+reach a worker. Admission is bounded like the password hasher: once
+``workers + max_queue`` jobs are in flight new ones fail with
+:class:`FacePipelineBusy`. Per-stage timings (queue, decode, resize,
+detect, encode) are returned with every result and recorded as metrics.
+``detect_many`` splits a batch into one job per worker, so N images cost
+at most ``workers`` round trips to the pool instead of N.
+"""
+
+import asyncio
+import binascii
+import importlib.util
+import io
+import logging
+import re
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+import metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_DATA_URL_PREFIX = re.compile(r"^data:[\w/+.-]*(;[\w=-]+)*;base64,")
+_WHITESPACE = re.compile(r"\s")
+# Base64 characters decoded per step; a multiple of 4 so chunks decode independently.
+_DECODE_CHUNK = 256 * 1024
+_DETECTION_FAILED = "Face detection failed for this image"
+# What Pillow raises for damaged or hostile files, depending on the codec.
+_PILLOW_ERRORS = (OSError, ValueError, SyntaxError, EOFError, struct.error)
+
+
+class FacePipelineBusy(Exception):
+    """Raised when the detection queue is full."""
+
+
+class FacePipelineCrashed(FacePipelineBusy):
+    """A worker died mid-job; the pool has been replaced, so a retry can succeed."""
+
+
+class FacePipelineUnavailable(Exception):
+    """Raised when face_recognition is not installed."""
+
+
+class ImageRejected(ValueError):
+    """The payload is not a usable image."""
+
+
+class ImageTooLarge(ImageRejected):
+    """The payload exceeds the byte or pixel limit."""
+
+
+@dataclass
+class FaceDetection:
+    # Largest face first.
+    encodings: List[np.ndarray]
+    locations: List[Tuple[int, int, int, int]]
+    image_size: Tuple[int, int]
+    timings: Dict[str, float] = field(default_factory=dict)  # milliseconds per stage
+
+
+def _strip_payload(image_data: str) -> str:
+    payload = _DATA_URL_PREFIX.sub("", image_data, count=1)
+    if _WHITESPACE.search(payload):
+        payload = _WHITESPACE.sub("", payload)
+    return payload
+
+
+def _decoded_size(payload: str) -> int:
+    return len(payload) * 3 // 4 - payload[-2:].count("=")
+
+
+def _decode(payload: str) -> bytes:
+    out = bytearray()
+    try:
+        for start in range(0, len(payload), _DECODE_CHUNK):
+            out += binascii.a2b_base64(payload[start:start + _DECODE_CHUNK])
+    except binascii.Error as exc:
+        raise ImageRejected("Image data is not valid base64") from exc
+    return bytes(out)
+
+
+def _init_worker() -> None:
+    # Importing face_recognition loads the dlib models; run one detection
+    # so the first real job does not pay for lazy initialisation either.
+    import face_recognition
+
+    face_recognition.face_locations(np.zeros((32, 32, 3), dtype=np.uint8))
+
+
+def detect_and_encode(
+    payload: str, max_pixels: int, max_side: int, upsample: int, model: str, submitted_at: float
+) -> Dict[str, object]:
+    """Decode, downsample, detect and encode one image. Runs in a worker process."""
+    import face_recognition
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    timings = {"queue": (time.time() - submitted_at) * 1000}
+
+    started = time.perf_counter()
+    raw = _decode(payload)
+    try:
+        image = Image.open(io.BytesIO(raw))
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLarge(f"Image exceeds the {max_pixels} pixel limit") from exc
+    except UnidentifiedImageError as exc:
+        raise ImageRejected("Unsupported image format") from exc
+    except _PILLOW_ERRORS as exc:
+        raise ImageRejected("Image data is truncated or corrupt") from exc
+    # Only the header has been read so far.
+    if image.width * image.height > max_pixels:
+        raise ImageTooLarge(f"Image exceeds the {max_pixels} pixel limit")
+    timings["decode"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    try:
+        image.draft("RGB", (max_side, max_side))  # JPEG: decode at 1/2, 1/4 or 1/8 scale
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((max_side, max_side))
+        pixels = np.asarray(image)
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLarge(f"Image exceeds the {max_pixels} pixel limit") from exc
+    except _PILLOW_ERRORS as exc:
+        raise ImageRejected("Image data is truncated or corrupt") from exc
+    timings["resize"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    locations = face_recognition.face_locations(pixels, number_of_times_to_upsample=upsample, model=model)
+    locations.sort(key=lambda box: (box[2] - box[0]) * (box[1] - box[3]), reverse=True)
+    timings["detect"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    encodings = face_recognition.face_encodings(pixels, known_face_locations=locations)
+    timings["encode"] = (time.perf_counter() - started) * 1000
+
+    return {
+        "encodings": [np.asarray(encoding, dtype=np.float32) for encoding in encodings],
+        "locations": [tuple(int(v) for v in box) for box in locations],
+        "image_size": image.size,
+        "timings": timings,
+    }
+
+
+def detect_and_encode_many(
+    payloads: Sequence[str], max_pixels: int, max_side: int, upsample: int, model: str, submitted_at: float
+) -> List[Union[Dict[str, object], ImageRejected]]:
+    """``detect_and_encode`` over several images in one job; a failing image yields its error."""
+    results: List[Union[Dict[str, object], ImageRejected]] = []
+    for payload in payloads:
+        try:
+            results.append(detect_and_encode(payload, max_pixels, max_side, upsample, model, submitted_at))
+        except ImageRejected as exc:
+            results.append(exc)
+        except Exception:
+            logger.exception("Face detection failed for one image of a batch")
+            results.append(ImageRejected(_DETECTION_FAILED))
+    return results
+
+
+class FacePipeline:
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        max_bytes: int,
+        max_pixels: int,
+        max_side: int,
+        upsample: int = 1,
+        model: str = "hog",
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_side = max_side
+        self.upsample = upsample
+        self.model = model
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Only touched from the event loop thread, so a plain int is enough.
+        self._in_flight = 0
+        self._rejected = metrics.counter("face_pipeline.rejected")
+        self._stage_latency = {
+            stage: metrics.latency(f"face_pipeline.{stage}")
+            for stage in ("queue", "decode", "resize", "detect", "encode")
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec("face_recognition") is not None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            if not self.is_available():
+                raise FacePipelineUnavailable("face_recognition is not installed")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._executor
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Drop a pool whose worker died so the next job starts a fresh one."""
+        if self._executor is pool:
+            self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def start(self) -> None:
+        """Start the workers now so their model loading does not delay the first request."""
+        if not self.is_available():
+            logger.warning("face_recognition is not installed; face endpoints are disabled")
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        await asyncio.gather(*(loop.run_in_executor(pool, time.sleep, 0.1) for _ in range(self.workers)))
+
+    def check_payload(self, image_data: str) -> str:
+        """Return the bare base64 payload, or raise if it decodes to more than ``max_bytes``."""
+        payload = _strip_payload(image_data)
+        if not payload:
+            raise ImageRejected("Image data is empty")
+        if _decoded_size(payload) > self.max_bytes:
+            raise ImageTooLarge(f"Image exceeds the {self.max_bytes} byte limit")
+        return payload
+
+    async def detect(self, image_data: str) -> FaceDetection:
+        """Find and encode the faces in a base64 image (optionally a data URL)."""
+        payload = self.check_payload(image_data)
+        if self._in_flight >= self.workers + self.max_queue:
+            self._rejected.inc()
+            raise FacePipelineBusy("Face detection queue is full")
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._pool()
+            result = await loop.run_in_executor(
+                pool, detect_and_encode,
+                payload, self.max_pixels, self.max_side, self.upsample, self.model, time.time(),
+            )
+        except BrokenProcessPool as exc:
+            logger.error("Face detection worker died; restarting the pool")
+            self._discard_pool(pool)
+            raise FacePipelineCrashed("Face detection worker crashed") from exc
+        finally:
+            self._in_flight -= 1
+
+        return self._detection(result)
+
+    def _detection(self, result: Dict[str, object]) -> FaceDetection:
+        for stage, ms in result["timings"].items():  # type: ignore[union-attr]
+            self._stage_latency[stage].observe(ms / 1000)
+        return FaceDetection(**result)  # type: ignore[arg-type]
+
+    async def detect_many(self, images: Sequence[str]) -> List[Union[FaceDetection, ImageRejected]]:
+        """Detect faces in several base64 images, spread over the workers.
+
+        Returns one entry per image, in order: its detection, or the
+        :class:`ImageRejected` explaining why it was unusable.
+        """
+        results: List[Union[FaceDetection, ImageRejected, None]] = [None] * len(images)
+        pending: List[Tuple[int, str]] = []
+        for position, image_data in enumerate(images):
+            try:
+                pending.append((position, self.check_payload(image_data)))
+            except ImageRejected as exc:
+                results[position] = exc
+        jobs = [pending[i::self.workers] for i in range(min(self.workers, len(pending)))]
+        if self._in_flight + len(jobs) > self.workers + self.max_queue:
+            self._rejected.inc()
+            raise FacePipelineBusy("Face detection queue is full")
+
+        self._in_flight += len(jobs)
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._pool() if jobs else None
+            submitted_at = time.time()
+            outputs = await asyncio.gather(*(
+                loop.run_in_executor(
+                    pool, detect_and_encode_many, [payload for _, payload in job],
+                    self.max_pixels, self.max_side, self.upsample, self.model, submitted_at,
+                )
+                for job in jobs
+            ), return_exceptions=True)
+        finally:
+            self._in_flight -= len(jobs)
+
+        for job, output in zip(jobs, outputs):
+            if isinstance(output, asyncio.CancelledError):
+                raise output
+            if isinstance(output, BaseException):
+                # The job itself died (e.g. a crashed worker); only its images fail.
+                logger.error("Face detection job of %d images failed", len(job), exc_info=output)
+                if isinstance(output, BrokenProcessPool) and pool is not None:
+                    self._discard_pool(pool)
+                output = [ImageRejected(_DETECTION_FAILED)] * len(job)
+            for (position, _), result in zip(job, output):
+                results[position] = result if isinstance(result, ImageRejected) else self._detection(result)
+        metrics.counter("face_pipeline.batch_images").inc(len(images))
+        return results  # type: ignore[return-value]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+face_pipeline = FacePipeline(
+    workers=settings.face_pipeline_workers,
+    max_queue=settings.face_pipeline_max_queue,
+    max_bytes=settings.face_image_max_bytes,
+    max_pixels=settings.face_image_max_pixels,
+    max_side=settings.face_image_max_side,
+    upsample=settings.face_detection_upsample,
+    model=settings.face_detection_model,
+)
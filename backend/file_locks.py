@@ -0,0 +1,50 @@
+"""Non-blocking exclusive locks on open files, on POSIX and Windows.
+
+POSIX uses ``flock`` on the whole file. Windows has no advisory whole-file
+lock, so ``msvcrt.locking`` locks the first byte instead; callers only ever
+contend on that byte, which gives the same mutual exclusion between
+processes. Locks are tied to the file descriptor and are released by
+``unlock`` or when the file is closed.
+"""
+
+import os
+import sys
+
+if sys.platform == "win32":
+    import msvcrt
+
+    def try_lock(fd: int) -> bool:
+        """Take an exclusive lock on ``fd`` without waiting; False if someone else holds it."""
+        position = os.lseek(fd, 0, os.SEEK_CUR)
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        finally:
+            os.lseek(fd, position, os.SEEK_SET)
+        return True
+
+    def unlock(fd: int) -> None:
+        position = os.lseek(fd, 0, os.SEEK_CUR)
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        finally:
+            os.lseek(fd, position, os.SEEK_SET)
+
+else:
+    import fcntl
+
+    def try_lock(fd: int) -> bool:
+        """Take an exclusive lock on ``fd`` without waiting; False if someone else holds it."""
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
@@ -1,19 +1,54 @@
-from fastapi import FastAPI
+import logging
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
-from database import engine, Base, check_database_connection
+from database import engine, async_engine, Base, check_database_connection, is_postgres
+from message_search import ensure_sqlite_search_index
+from migration_ledger import pending_migrations
 from routers import auth, patients, appointments, messages, videos, groups, leads, staff, facial_recognition, geolocation
 from config import settings
+from auth import password_hasher, require_role
+import models
+from read_receipts import read_receipts
+from media_processing import media_processor
+from media_sweeper import media_sweeper
+from face_matching import face_matcher
+from face_pipeline import face_pipeline
+import metrics
+
+logger = logging.getLogger(__name__)
 
-# Create database tables
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    Base.metadata.create_all(bind=engine)
+    if is_postgres:
+        # Schema is owned by scripts/run_migrations.py; just check the ledger.
+        async with async_engine.connect() as connection:
+            pending = await pending_migrations(connection)
+        if pending:
+            logger.error("Refusing to start with pending database migrations: %s", ", ".join(pending))
+            raise RuntimeError(
+                f"Pending database migrations: {', '.join(pending)}. Run scripts/run_migrations.py "
+                "(a database created by the old create_all startup needs --baseline 000_baseline_schema.sql first)"
+            )
+    else:
+        # SQLite development database
+        Base.metadata.create_all(bind=engine)
+        ensure_sqlite_search_index(engine)
+    await media_processor.resume_pending()
+    if settings.media_sweep_enabled:
+        media_sweeper.start()
+    await face_pipeline.start()
     yield
     # Shutdown
-    pass
+    await media_sweeper.close()
+    face_matcher.save_index()
+    face_pipeline.shutdown()
+    await read_receipts.close()
+    await media_processor.close()
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Serenity Rehabilitation Center API",
@@ -28,6 +63,7 @@ app.add_middleware(
     allow_credentials=True if settings.allowed_origins != ["*"] else False,  # Can't use credentials with wildcard
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -48,7 +84,7 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    db_status = check_database_connection()
+    db_status = await check_database_connection()
     return {
         "status": "healthy" if db_status else "degraded",
         "service": "serenity-rehab-api", 
@@ -57,6 +93,11 @@ async def health_check():
         "environment": settings.environment
     }
 
+@app.get("/metrics")
+async def metrics_snapshot(current_user: models.User = Depends(require_role([models.UserRole.ADMIN]))):
+    """Internal counters and latencies; admins only."""
+    return metrics.snapshot()
+
 @app.get("/api/info")
 async def api_info():
     return {
@@ -0,0 +1,219 @@
+"""Background processing of uploaded videos.
+
+After an upload is saved the recording is queued here; a process pool
+running OpenCV probes its duration, grabs a poster frame and builds a
+horizontal strip of small thumbnails. Workers read the video from local
+disk or, for remote storage, from a presigned URL; the images are stored
+next to the video's key (``<name>.poster.jpg`` / ``<name>.thumbs.jpg``)
+and the row moves from
+``pending`` through ``processing`` to ``ready`` or ``failed``. Decoding is
+CPU-bound and OpenCV holds the GIL for parts of it, hence processes rather
+than threads. At most ``workers`` videos are decoded at once; anything
+still pending when the process stops is picked up again on the next start.
+If a worker dies the pool is replaced and the recordings it was working
+on go back to ``pending`` rather than ``failed``.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+
+import metrics
+import models
+from config import settings
+from database import AsyncSessionLocal
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+POSTER_HEIGHT = 360
+THUMBNAIL_HEIGHT = 90
+THUMBNAIL_COUNT = 8
+# Scratch space for generated images; on the upload volume so local saves are renames.
+WORK_DIR = os.path.join(settings.upload_dir, ".processing")
+
+
+def derived_image_paths(path: str) -> List[str]:
+    """Poster and thumbnail strip paths generated for the video at ``path``."""
+    stem = os.path.splitext(path)[0]
+    return [f"{stem}.poster.jpg", f"{stem}.thumbs.jpg"]
+
+
+def _resize_to_height(cv2, frame, height: int):
+    h, w = frame.shape[:2]
+    width = max(1, round(w * height / h))
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def _read_frame(cv2, capture, index: int):
+    capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+    ok, frame = capture.read()
+    return frame if ok else None
+
+
+def process_video(source: str, poster_target: str, thumbnail_target: str) -> Dict[str, Optional[object]]:
+    """Probe ``source`` (path or URL) and write its poster and thumbnail strip.
+
+    Runs in a worker process. Returns the duration and which of the two
+    images could be written.
+    """
+    import cv2  # imported in the worker only; keeps OpenCV out of the web process
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Unreadable video: {source}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        duration = round(frame_count / fps) if fps > 0 and frame_count > 0 else None
+
+        poster_path = thumbnail_path = None
+
+        # Poster: 10% in skips black lead-in frames on most recordings.
+        poster = _read_frame(cv2, capture, frame_count // 10) if frame_count else None
+        if poster is None:
+            poster = _read_frame(cv2, capture, 0)
+        if poster is not None:
+            poster_path = poster_target
+            cv2.imwrite(poster_path, _resize_to_height(cv2, poster, POSTER_HEIGHT),
+                        [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+        if frame_count > 0:
+            step = frame_count / THUMBNAIL_COUNT
+            frames = []
+            for i in range(THUMBNAIL_COUNT):
+                frame = _read_frame(cv2, capture, int(step * i + step / 2))
+                if frame is not None:
+                    frames.append(_resize_to_height(cv2, frame, THUMBNAIL_HEIGHT))
+            if frames:
+                thumbnail_path = thumbnail_target
+                cv2.imwrite(thumbnail_path, cv2.hconcat(frames), [cv2.IMWRITE_JPEG_QUALITY, 75])
+
+        return {
+            "duration_seconds": duration,
+            "poster_path": poster_path,
+            "thumbnail_path": thumbnail_path,
+        }
+    finally:
+        capture.release()
+
+
+class MediaProcessor:
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._queued: Set[int] = set()
+        self._latency = metrics.latency("media_processing.latency")
+        self._failed = metrics.counter("media_processing.failed")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use so importing this module never forks.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._executor
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Drop a pool whose worker died so the next job starts a fresh one."""
+        if self._executor is pool:
+            self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, video_id: int, key: str) -> None:
+        """Queue a recording for processing; returns immediately."""
+        if video_id in self._queued:
+            return
+        self._queued.add(video_id)
+        task = asyncio.create_task(self._run(video_id, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, video_id: int, key: str) -> None:
+        pool = self._pool()
+        assert self._semaphore is not None
+        os.makedirs(WORK_DIR, exist_ok=True)
+        work_dir = tempfile.mkdtemp(dir=WORK_DIR)
+        try:
+            async with self._semaphore:
+                await self._set_status(video_id, models.MediaProcessingStatus.PROCESSING)
+                source = storage.local_path(key) or await storage.read_url(key)
+                poster_key, thumbnail_key = derived_image_paths(key)
+                outputs = [os.path.join(work_dir, os.path.basename(k)) for k in (poster_key, thumbnail_key)]
+                started = time.perf_counter()
+                loop = asyncio.get_running_loop()
+                try:
+                    result = await loop.run_in_executor(pool, process_video, source, *outputs)
+                except BrokenProcessPool:
+                    # A worker died (crash or OOM), taking every job in flight with it;
+                    # that says nothing about this video, so leave it for the next run.
+                    logger.warning("Media worker pool broke while processing video %s; leaving it pending", video_id)
+                    self._discard_pool(pool)
+                    await self._set_status(video_id, models.MediaProcessingStatus.PENDING)
+                    return
+                except Exception:
+                    self._failed.inc()
+                    logger.exception("Processing video %s failed", video_id)
+                    await self._set_status(video_id, models.MediaProcessingStatus.FAILED)
+                    return
+                finally:
+                    self._latency.observe(time.perf_counter() - started)
+
+                for field, output, target in (
+                    ("poster_path", outputs[0], poster_key),
+                    ("thumbnail_path", outputs[1], thumbnail_key),
+                ):
+                    if result[field]:
+                        await storage.save(output, target, "image/jpeg")
+                        result[field] = target
+                await self._set_status(video_id, models.MediaProcessingStatus.READY, **result)
+        except Exception:
+            logger.exception("Could not record processing result for video %s", video_id)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            self._queued.discard(video_id)
+
+    async def _set_status(self, video_id: int, processing_status: models.MediaProcessingStatus, **values) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.VideoRecording)
+                .where(models.VideoRecording.id == video_id)
+                .values(processing_status=processing_status, **values)
+            )
+            await db.commit()
+
+    async def resume_pending(self) -> int:
+        """Requeue recordings left unprocessed by a previous run."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.VideoRecording.id, models.VideoRecording.file_path).where(
+                    models.VideoRecording.processing_status.in_([
+                        models.MediaProcessingStatus.PENDING,
+                        models.MediaProcessingStatus.PROCESSING,
+                    ])
+                )
+            )
+            rows = result.all()
+        for video_id, key in rows:
+            self.submit(video_id, key)
+        return len(rows)
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+media_processor = MediaProcessor(settings.media_processing_workers)
@@ -0,0 +1,251 @@
+"""Background reconciliation of stored media against the database.
+
+A pass has two phases. The first walks ``settings.upload_dir`` in sorted
+path order, a batch at a time, and looks up which of the files are still
+referenced by a ``VideoRecording`` (video, poster or thumbnail strip) or a
+``MediaBlob``. Unreferenced files older than the grace period, left behind
+by a crash between a file write and its commit, are moved to
+``<upload_dir>/.quarantine/`` rather than deleted, so an operator can put
+them back or purge them. The second phase pages through
+``video_recordings`` by id and reports rows whose file is missing.
+
+Progress is saved to ``<upload_dir>/.sweeper/state.json`` after every
+batch, so a restart resumes mid-pass. Batches are paced to
+``media_sweep_rate`` entries per second to stay out of the way of request
+I/O, and a file lock keeps it to one sweeper per upload volume when
+several workers run. Hidden directories (upload sessions, staging and
+processing scratch space, the quarantine itself) are never swept.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import or_, select
+
+import metrics
+import models
+from config import settings
+from database import AsyncSessionLocal
+from file_locks import try_lock, unlock
+from storage import LocalStorage, storage
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = os.path.join(settings.upload_dir, ".sweeper")
+QUARANTINE_DIR = os.path.join(settings.upload_dir, ".quarantine")
+# Dangling row ids kept in the saved report.
+MAX_REPORTED_ROWS = 1000
+
+
+def _scan_after(root: str, after: Tuple[str, ...], limit: int) -> List[Tuple[Tuple[str, ...], float]]:
+    """Up to ``limit`` files under ``root`` sorting after ``after``, with their mtimes.
+
+    Paths are compared as tuples of components; subtrees that sort wholly
+    before the cursor are skipped without being listed.
+    """
+    found: List[Tuple[Tuple[str, ...], float]] = []
+
+    def walk(directory: str, prefix: Tuple[str, ...]) -> None:
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted((e for e in it if not e.name.startswith(".")), key=lambda e: e.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if len(found) >= limit:
+                return
+            parts = prefix + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                if parts < after and after[:len(parts)] != parts:
+                    continue
+                walk(entry.path, parts)
+            elif entry.is_file(follow_symlinks=False) and parts > after:
+                try:
+                    found.append((parts, entry.stat(follow_symlinks=False).st_mtime))
+                except FileNotFoundError:
+                    continue
+
+    walk(root, ())
+    return found
+
+
+def _quarantine(key: str, relative: Sequence[str]) -> None:
+    target = os.path.join(QUARANTINE_DIR, *relative)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(key, target)
+
+
+class MediaSweeper:
+    def __init__(self, interval_seconds: float, grace_seconds: float, rate: float, batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.grace_seconds = grace_seconds
+        self.rate = max(1.0, rate)
+        self.batch_size = max(1, batch_size)
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        self._quarantined = metrics.counter("media_sweeper.quarantined")
+        self._dangling = metrics.counter("media_sweeper.dangling_rows")
+        self._scanned = metrics.counter("media_sweeper.scanned")
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(STATE_DIR, "state.json")
+
+    def _load_state(self) -> Dict[str, object]:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, object]) -> None:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _acquire_lock(self) -> bool:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        lock_file = open(os.path.join(STATE_DIR, "lock"), "a")
+        if not try_lock(lock_file.fileno()):
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _pace(self, entries: int) -> None:
+        await asyncio.sleep(entries / self.rate)
+
+    async def _referenced(self, keys: List[str]) -> Set[str]:
+        recordings = models.VideoRecording
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(recordings.file_path, recordings.poster_path, recordings.thumbnail_path).where(
+                    or_(
+                        recordings.file_path.in_(keys),
+                        recordings.poster_path.in_(keys),
+                        recordings.thumbnail_path.in_(keys),
+                    )
+                )
+            )
+            referenced = {path for row in rows for path in row if path}
+            blobs = await db.scalars(select(models.MediaBlob.path).where(models.MediaBlob.path.in_(keys)))
+            referenced.update(blobs)
+        return referenced
+
+    async def sweep_files(self, state: Dict[str, object]) -> bool:
+        """Check the next batch of files; returns False once the walk is done."""
+        after = tuple(state.get("file_cursor") or ())
+        batch = await asyncio.to_thread(_scan_after, settings.upload_dir, after, self.batch_size)
+        if not batch:
+            return False
+
+        keys = [os.path.join(settings.upload_dir, *parts) for parts, _ in batch]
+        referenced = await self._referenced(keys)
+        cutoff = time.time() - self.grace_seconds
+        for key, (parts, mtime) in zip(keys, batch):
+            if key in referenced or mtime > cutoff:
+                continue
+            try:
+                await asyncio.to_thread(_quarantine, key, parts)
+            except FileNotFoundError:
+                continue
+            self._quarantined.inc()
+            state["quarantined"] = int(state.get("quarantined", 0)) + 1
+            logger.warning("Quarantined unreferenced media file %s", key)
+
+        self._scanned.inc(len(batch))
+        state["file_cursor"] = list(batch[-1][0])
+        await self._pace(len(batch))
+        return True
+
+    async def sweep_rows(self, state: Dict[str, object]) -> bool:
+        """Check the next batch of recordings; returns False once all were seen."""
+        after_id = int(state.get("row_cursor") or 0)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.VideoRecording.id, models.VideoRecording.file_path)
+                .where(models.VideoRecording.id > after_id)
+                .order_by(models.VideoRecording.id)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+        if not rows:
+            return False
+
+        dangling: List[int] = state.setdefault("dangling", [])  # type: ignore[assignment]
+        for video_id, key in rows:
+            if not await storage.exists(key):
+                self._dangling.inc()
+                logger.warning("Video recording %s points at missing file %s", video_id, key)
+                if len(dangling) < MAX_REPORTED_ROWS:
+                    dangling.append(video_id)
+
+        state["row_cursor"] = rows[-1].id
+        await self._pace(len(rows))
+        return True
+
+    async def run_pass(self) -> Dict[str, object]:
+        """Finish the current pass (resuming a saved one) and return its report."""
+        state = self._load_state()
+        if not state.get("started_at"):
+            state = {"started_at": time.time(), "phase": "files", "last_report": state.get("last_report")}
+
+        # Only the local driver has a directory to walk.
+        if state["phase"] == "files" and isinstance(storage, LocalStorage):
+            while await self.sweep_files(state):
+                self._save_state(state)
+        state["phase"] = "rows"
+        self._save_state(state)
+
+        while await self.sweep_rows(state):
+            self._save_state(state)
+
+        report = {
+            "started_at": state["started_at"],
+            "finished_at": time.time(),
+            "quarantined": state.get("quarantined", 0),
+            "dangling_rows": state.get("dangling", []),
+        }
+        self._save_state({"last_report": report})
+        if report["dangling_rows"]:
+            logger.warning("Media sweep found %d recordings with missing files", len(report["dangling_rows"]))
+        return report
+
+    async def _loop(self) -> None:
+        while not self._acquire_lock():
+            # Another worker owns the sweep; take over if it goes away.
+            await asyncio.sleep(self.interval_seconds)
+        while True:
+            try:
+                await self.run_pass()
+            except Exception:
+                logger.exception("Media sweep failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._lock_file is not None:
+            unlock(self._lock_file.fileno())
+            self._lock_file.close()
+            self._lock_file = None
+
+
+media_sweeper = MediaSweeper(
+    interval_seconds=settings.media_sweep_interval_minutes * 60,
+    grace_seconds=settings.media_sweep_grace_hours * 3600,
+    rate=settings.media_sweep_rate,
+    batch_size=settings.media_sweep_batch_size,
+)
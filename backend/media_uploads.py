@@ -0,0 +1,98 @@
+"""Streaming of uploaded files to disk.
+
+Uploads are copied in fixed-size chunks to a temporary file next to their
+final location, so memory use per upload stays at one chunk whatever the
+file size. The size limit is enforced while streaming and the SHA-256 is
+computed on the way through; only a complete file is moved into place,
+with an atomic ``os.replace``.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass
+
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+
+import metrics
+from config import settings
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size exceeds maximum limit of {settings.max_file_size} bytes"
+    )
+
+
+async def stream_upload(upload: UploadFile, directory: str, extension: str = "") -> StoredUpload:
+    """Copy ``upload`` into ``directory`` under a fresh unique name.
+
+    Raises 413 as soon as more than ``settings.max_file_size`` bytes have
+    been received; the partial file is removed on any failure.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"{uuid.uuid4()}{extension}"
+    final_path = os.path.join(directory, name)
+    temp_path = os.path.join(directory, f".{name}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    timer = metrics.latency("uploads.stream")
+    started = time.monotonic()
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(settings.upload_chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.max_file_size:
+                    metrics.counter("uploads.rejected_too_large").inc()
+                    raise _too_large()
+                digest.update(chunk)
+                await out.write(chunk)
+        os.replace(temp_path, final_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        timer.observe(time.monotonic() - started)
+
+    metrics.counter("uploads.bytes").inc(size)
+    return StoredUpload(path=final_path, size=size, sha256=digest.hexdigest())
+
+
+def _hash_file(path: str, chunk_size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def adopt_file(source_path: str, directory: str, extension: str = "") -> StoredUpload:
+    """Move an already-complete file into ``directory`` under a unique name.
+
+    Used for uploads assembled elsewhere (e.g. resumable sessions); the
+    hash is computed in a worker thread. ``source_path`` must be on the
+    same filesystem so the move is an atomic rename.
+    """
+    os.makedirs(directory, exist_ok=True)
+    size = os.path.getsize(source_path)
+    sha256 = await asyncio.to_thread(_hash_file, source_path, settings.upload_chunk_size)
+    final_path = os.path.join(directory, f"{uuid.uuid4()}{extension}")
+    os.replace(source_path, final_path)
+    metrics.counter("uploads.bytes").inc(size)
+    return StoredUpload(path=final_path, size=size, sha256=sha256)
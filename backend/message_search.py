@@ -0,0 +1,90 @@
+"""Full-text search over message subjects and bodies.
+
+On Postgres the ``messages.search_vector`` generated column (GIN-indexed,
+see ``migrations/006_message_search.sql``) is matched with
+``websearch_to_tsquery`` and ranked with ``ts_rank_cd``. The SQLite
+development database uses an external-content FTS5 table kept in sync by
+triggers and ranked with ``bm25``. Either way results are ordered by
+``(rank, id)`` descending and paged with a ranked cursor.
+"""
+
+import logging
+from typing import Optional
+
+from sqlalchemy import and_, column, func, literal_column, or_, select, table, text
+from sqlalchemy.engine import Engine
+
+import models
+from database import is_postgres
+from pagination import decode_ranked_cursor
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+       USING fts5(subject, content, content='messages', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+         INSERT INTO messages_fts(rowid, subject, content) VALUES (new.id, new.subject, new.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+         INSERT INTO messages_fts(messages_fts, rowid, subject, content) VALUES ('delete', old.id, old.subject, old.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF subject, content ON messages BEGIN
+         INSERT INTO messages_fts(messages_fts, rowid, subject, content) VALUES ('delete', old.id, old.subject, old.content);
+         INSERT INTO messages_fts(rowid, subject, content) VALUES (new.id, new.subject, new.content);
+       END""",
+]
+
+
+def ensure_sqlite_search_index(engine: Engine) -> None:
+    """Create (and on first run populate) the FTS5 index for SQLite databases."""
+    with engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        ).first()
+        for statement in _SQLITE_FTS_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+            logger.info("Built SQLite FTS5 index for messages")
+
+
+def _fts5_query(query: str) -> str:
+    # Quote every term so user input can't trip FTS5 query syntax; terms are ANDed.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def build_search_query(query: str, user_id: int, cursor: Optional[str], limit: int):
+    """Select ``(Message, rank)`` rows matching ``query`` that ``user_id`` may see."""
+    visible = or_(
+        models.Message.sender_id == user_id,
+        models.Message.recipient_id == user_id,
+        models.Message.group_id.in_(
+            select(models.GroupMember.group_id).where(models.GroupMember.user_id == user_id)
+        ),
+    )
+
+    if is_postgres:
+        search_vector = literal_column("messages.search_vector")
+        tsquery = func.websearch_to_tsquery(literal_column("'english'::regconfig"), query)
+        rank = func.ts_rank_cd(search_vector, tsquery)
+        stmt = select(models.Message, rank.label("rank")).where(search_vector.op("@@")(tsquery))
+    else:
+        # bm25() is lower-is-better; negate so both backends sort descending.
+        fts = table("messages_fts", column("rowid"))
+        rank = literal_column("-bm25(messages_fts)")
+        stmt = (
+            select(models.Message, rank.label("rank"))
+            .join(fts, fts.c.rowid == models.Message.id)
+            .where(literal_column("messages_fts").op("MATCH")(_fts5_query(query)))
+        )
+
+    stmt = stmt.where(visible)
+    if cursor:
+        anchor_rank, anchor_id = decode_ranked_cursor(cursor)
+        stmt = stmt.where(or_(
+            rank < anchor_rank,
+            and_(rank == anchor_rank, models.Message.id < anchor_id),
+        ))
+    return stmt.order_by(rank.desc(), models.Message.id.desc()).limit(limit)
+
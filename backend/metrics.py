@@ -0,0 +1,91 @@
+"""Lightweight in-process metrics.
+
+Each worker process keeps its own counters and latency samples; the
+``/metrics`` endpoint returns a JSON snapshot for the worker that served it.
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Any
+
+
+class LatencyStats:
+    """Running count/total/max plus a bounded reservoir for percentiles."""
+
+    def __init__(self, sample_size: int = 1024):
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=sample_size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            self._samples.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+
+        def pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": count,
+            "avg_ms": (total / count * 1000) if count else 0.0,
+            "p50_ms": pct(0.50) * 1000,
+            "p95_ms": pct(0.95) * 1000,
+            "p99_ms": pct(0.99) * 1000,
+            "max_ms": maximum * 1000,
+        }
+
+
+class Counter:
+    """Monotonic counter."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+_latencies: Dict[str, LatencyStats] = {}
+_counters: Dict[str, Counter] = {}
+_registry_lock = threading.Lock()
+
+
+def latency(name: str) -> LatencyStats:
+    """Return (creating on first use) the latency series called ``name``."""
+    with _registry_lock:
+        if name not in _latencies:
+            _latencies[name] = LatencyStats()
+        return _latencies[name]
+
+
+def counter(name: str) -> Counter:
+    """Return (creating on first use) the counter called ``name``."""
+    with _registry_lock:
+        if name not in _counters:
+            _counters[name] = Counter()
+        return _counters[name]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return every registered metric as plain JSON-serialisable data."""
+    with _registry_lock:
+        latencies = dict(_latencies)
+        counters = dict(_counters)
+    return {
+        "latency": {name: stats.snapshot() for name, stats in latencies.items()},
+        "counters": {name: c.value for name, c in counters.items()},
+    }
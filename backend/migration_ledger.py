@@ -0,0 +1,73 @@
+"""Versioned SQL migrations tracked in a ``schema_migrations`` ledger.
+
+Migration files live in ``backend/migrations`` and are named
+``NNN_description.sql``; they are applied in (number, filename) order and
+each one is recorded with the SHA-256 of its contents. A file is applied at
+most once, and editing a file after it has been applied is reported as a
+checksum mismatch instead of being silently re-run.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATION_PATTERN = re.compile(r"^(\d+)_[\w\-]+\.sql$")
+
+LEDGER_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    filename VARCHAR(255) PRIMARY KEY,
+    checksum CHAR(64) NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    execution_ms INTEGER
+)
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    filename: str
+    path: Path
+    checksum: str
+
+    def read(self) -> str:
+        return self.path.read_text()
+
+
+def checksum_file(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Return every migration file in apply order."""
+    found = []
+    for path in directory.iterdir():
+        match = MIGRATION_PATTERN.match(path.name)
+        if match and path.is_file():
+            found.append((int(match.group(1)), path.name, path))
+    found.sort()
+    return [Migration(name, path, checksum_file(path)) for _, name, path in found]
+
+
+def diff_ledger(migrations: List[Migration], applied: Dict[str, str]):
+    """Split migrations into (pending, changed) given ``{filename: checksum}``."""
+    pending = [m for m in migrations if m.filename not in applied]
+    changed = [m for m in migrations if m.filename in applied and applied[m.filename] != m.checksum]
+    return pending, changed
+
+
+async def pending_migrations(connection: AsyncConnection) -> List[str]:
+    """Names of migration files not yet recorded in the ledger (one query)."""
+    migrations = discover_migrations()
+    exists = await connection.scalar(text("SELECT to_regclass('schema_migrations') IS NOT NULL"))
+    if not exists:
+        return [m.filename for m in migrations]
+    result = await connection.execute(text("SELECT filename, checksum FROM schema_migrations"))
+    applied = {row.filename: row.checksum.strip() for row in result}
+    pending, _ = diff_ledger(migrations, applied)
+    return [m.filename for m in pending]
@@ -0,0 +1,326 @@
+-- Baseline schema: every table and index in models.py, rendered with SQLAlchemy's
+-- PostgreSQL dialect (CreateTable/CreateIndex, if_not_exists). This is what
+-- Base.metadata.create_all used to build at startup; later migrations are
+-- idempotent on top of it. Databases already created by create_all record it
+-- without running it: scripts/run_migrations.py --baseline 000_baseline_schema.sql
+
+CREATE TABLE IF NOT EXISTS leads (
+    id SERIAL NOT NULL,
+    first_name VARCHAR NOT NULL,
+    last_name VARCHAR NOT NULL,
+    email VARCHAR NOT NULL,
+    phone VARCHAR,
+    subject VARCHAR,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_leads_email ON leads (email);
+CREATE INDEX IF NOT EXISTS ix_leads_id ON leads (id);
+
+CREATE TABLE IF NOT EXISTS media_blobs (
+    id SERIAL NOT NULL,
+    sha256 VARCHAR(64) NOT NULL,
+    path VARCHAR NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    UNIQUE (sha256)
+);
+
+CREATE INDEX IF NOT EXISTS ix_media_blobs_id ON media_blobs (id);
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL NOT NULL,
+    email VARCHAR NOT NULL,
+    hashed_password VARCHAR NOT NULL,
+    first_name VARCHAR NOT NULL,
+    last_name VARCHAR NOT NULL,
+    phone VARCHAR,
+    role VARCHAR,
+    is_active BOOLEAN,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email);
+CREATE INDEX IF NOT EXISTS ix_users_id ON users (id);
+
+CREATE TABLE IF NOT EXISTS groups (
+    id SERIAL NOT NULL,
+    name VARCHAR NOT NULL,
+    description TEXT,
+    group_type VARCHAR,
+    created_by INTEGER,
+    is_active BOOLEAN,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    FOREIGN KEY(created_by) REFERENCES users (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_groups_id ON groups (id);
+
+CREATE TABLE IF NOT EXISTS patients (
+    id SERIAL NOT NULL,
+    user_id INTEGER,
+    patient_id VARCHAR,
+    date_of_birth TIMESTAMP WITHOUT TIME ZONE,
+    emergency_contact_name VARCHAR,
+    emergency_contact_phone VARCHAR,
+    insurance_provider VARCHAR,
+    insurance_policy_number VARCHAR,
+    admission_date TIMESTAMP WITHOUT TIME ZONE,
+    treatment_plan TEXT,
+    medical_history JSON,
+    current_medications JSON,
+    allergies TEXT,
+    PRIMARY KEY (id),
+    UNIQUE (user_id),
+    FOREIGN KEY(user_id) REFERENCES users (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_patients_id ON patients (id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_patients_patient_id ON patients (patient_id);
+
+CREATE TABLE IF NOT EXISTS staff (
+    id SERIAL NOT NULL,
+    user_id INTEGER,
+    staff_id VARCHAR,
+    department VARCHAR,
+    specialization VARCHAR,
+    license_number VARCHAR,
+    PRIMARY KEY (id),
+    UNIQUE (user_id),
+    FOREIGN KEY(user_id) REFERENCES users (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_staff_id ON staff (id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_staff_staff_id ON staff (staff_id);
+
+CREATE TABLE IF NOT EXISTS activity_logs (
+    id SERIAL NOT NULL,
+    patient_id INTEGER,
+    activity_type VARCHAR NOT NULL,
+    activity_name VARCHAR,
+    duration_minutes INTEGER,
+    score FLOAT,
+    notes TEXT,
+    activity_metadata JSON,
+    completed_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_activity_logs_id ON activity_logs (id);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id SERIAL NOT NULL,
+    patient_id INTEGER,
+    staff_id INTEGER,
+    appointment_type VARCHAR,
+    scheduled_datetime TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    duration_minutes INTEGER,
+    status VARCHAR,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id),
+    FOREIGN KEY(staff_id) REFERENCES staff (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_appointments_id ON appointments (id);
+
+CREATE TABLE IF NOT EXISTS face_encodings (
+    id SERIAL NOT NULL,
+    user_id INTEGER NOT NULL,
+    patient_id INTEGER,
+    encoding BYTEA NOT NULL,
+    image_path VARCHAR,
+    is_active BOOLEAN,
+    confidence_score FLOAT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_face_encodings_id ON face_encodings (id);
+CREATE INDEX IF NOT EXISTS ix_face_encodings_user_id ON face_encodings (user_id);
+
+CREATE TABLE IF NOT EXISTS group_members (
+    id SERIAL NOT NULL,
+    group_id INTEGER,
+    user_id INTEGER,
+    joined_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    is_moderator BOOLEAN,
+    PRIMARY KEY (id),
+    FOREIGN KEY(group_id) REFERENCES groups (id),
+    FOREIGN KEY(user_id) REFERENCES users (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_group_members_id ON group_members (id);
+
+CREATE TABLE IF NOT EXISTS location_tracking (
+    id SERIAL NOT NULL,
+    user_id INTEGER NOT NULL,
+    patient_id INTEGER,
+    latitude FLOAT NOT NULL,
+    longitude FLOAT NOT NULL,
+    accuracy FLOAT,
+    altitude FLOAT,
+    speed FLOAT,
+    heading FLOAT,
+    address VARCHAR,
+    city VARCHAR,
+    state VARCHAR,
+    country VARCHAR,
+    postal_code VARCHAR,
+    tracking_type VARCHAR,
+    is_verified BOOLEAN,
+    verified_by INTEGER,
+    tracking_metadata JSON,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id),
+    FOREIGN KEY(verified_by) REFERENCES users (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_location_tracking_id ON location_tracking (id);
+CREATE INDEX IF NOT EXISTS ix_location_tracking_user_id ON location_tracking (user_id);
+
+CREATE TABLE IF NOT EXISTS medication_logs (
+    id SERIAL NOT NULL,
+    patient_id INTEGER,
+    medication_name VARCHAR NOT NULL,
+    dosage VARCHAR,
+    taken_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    notes TEXT,
+    side_effects TEXT,
+    PRIMARY KEY (id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_medication_logs_id ON medication_logs (id);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id SERIAL NOT NULL,
+    sender_id INTEGER,
+    recipient_id INTEGER,
+    group_id INTEGER,
+    subject VARCHAR,
+    content TEXT NOT NULL,
+    status VARCHAR,
+    is_group_message BOOLEAN,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    read_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (id),
+    FOREIGN KEY(sender_id) REFERENCES users (id),
+    FOREIGN KEY(recipient_id) REFERENCES users (id),
+    FOREIGN KEY(group_id) REFERENCES groups (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_messages_group_created ON messages (group_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_messages_id ON messages (id);
+CREATE INDEX IF NOT EXISTS ix_messages_pair_created ON messages (sender_id, recipient_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_messages_recipient_created ON messages (recipient_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_messages_sender_created ON messages (sender_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS patient_storage_usage (
+    patient_id INTEGER NOT NULL,
+    video_count INTEGER NOT NULL,
+    total_bytes BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (patient_id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id)
+);
+
+CREATE TABLE IF NOT EXISTS reminder_settings (
+    id SERIAL NOT NULL,
+    patient_id INTEGER NOT NULL,
+    email_enabled BOOLEAN,
+    sms_enabled BOOLEAN,
+    push_enabled BOOLEAN,
+    days_before JSON,
+    time_of_day VARCHAR,
+    PRIMARY KEY (id),
+    UNIQUE (patient_id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_reminder_settings_id ON reminder_settings (id);
+
+CREATE TABLE IF NOT EXISTS video_recordings (
+    id SERIAL NOT NULL,
+    patient_id INTEGER,
+    title VARCHAR,
+    description TEXT,
+    file_path VARCHAR NOT NULL,
+    duration_seconds INTEGER,
+    file_size_bytes INTEGER,
+    content_sha256 VARCHAR(64),
+    processing_status VARCHAR,
+    poster_path VARCHAR,
+    thumbnail_path VARCHAR,
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_video_recordings_content_sha256 ON video_recordings (content_sha256);
+CREATE INDEX IF NOT EXISTS ix_video_recordings_id ON video_recordings (id);
+CREATE INDEX IF NOT EXISTS ix_video_recordings_patient_recorded ON video_recordings (patient_id, recorded_at, id);
+CREATE INDEX IF NOT EXISTS ix_video_recordings_processing_status ON video_recordings (processing_status);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id SERIAL NOT NULL,
+    conversation_key VARCHAR NOT NULL,
+    group_id INTEGER,
+    last_message_id INTEGER,
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    UNIQUE (conversation_key),
+    FOREIGN KEY(group_id) REFERENCES groups (id),
+    FOREIGN KEY(last_message_id) REFERENCES messages (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_conversations_id ON conversations (id);
+
+CREATE TABLE IF NOT EXISTS reminders (
+    id SERIAL NOT NULL,
+    patient_id INTEGER NOT NULL,
+    appointment_id INTEGER,
+    reminder_type VARCHAR NOT NULL,
+    message TEXT,
+    scheduled_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    status VARCHAR,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (id),
+    FOREIGN KEY(patient_id) REFERENCES patients (id),
+    FOREIGN KEY(appointment_id) REFERENCES appointments (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_reminders_id ON reminders (id);
+
+CREATE TABLE IF NOT EXISTS conversation_participants (
+    id SERIAL NOT NULL,
+    conversation_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    peer_user_id INTEGER,
+    unread_count INTEGER NOT NULL,
+    last_read_message_id INTEGER,
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (id),
+    CONSTRAINT uq_conversation_participants_user UNIQUE (conversation_id, user_id),
+    FOREIGN KEY(conversation_id) REFERENCES conversations (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(peer_user_id) REFERENCES users (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_conversation_participants_id ON conversation_participants (id);
+CREATE INDEX IF NOT EXISTS ix_conversation_participants_user_recent ON conversation_participants (user_id, last_message_at);
@@ -0,0 +1,5 @@
+-- Composite indexes backing keyset (cursor) pagination of message listings
+CREATE INDEX IF NOT EXISTS ix_messages_recipient_created ON messages(recipient_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_messages_sender_created ON messages(sender_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_messages_pair_created ON messages(sender_id, recipient_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_messages_group_created ON messages(group_id, created_at, id);
@@ -0,0 +1,60 @@
+-- Materialized conversation summaries with per-participant unread counters
+CREATE TABLE IF NOT EXISTS conversations (
+    id SERIAL PRIMARY KEY,
+    conversation_key VARCHAR(255) UNIQUE NOT NULL, -- 'dm:<low>:<high>' or 'group:<id>'
+    group_id INTEGER REFERENCES groups(id) ON DELETE CASCADE,
+    last_message_id INTEGER REFERENCES messages(id) ON DELETE SET NULL,
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS conversation_participants (
+    id SERIAL PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    peer_user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    last_read_message_id INTEGER,
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    CONSTRAINT uq_conversation_participants_user UNIQUE (conversation_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_conversation_participants_user_recent ON conversation_participants(user_id, last_message_at);
+
+-- Backfill direct conversations from existing messages
+INSERT INTO conversations (conversation_key, last_message_id, last_message_at)
+SELECT 'dm:' || LEAST(sender_id, recipient_id) || ':' || GREATEST(sender_id, recipient_id),
+       MAX(id), MAX(created_at)
+FROM messages
+WHERE group_id IS NULL AND recipient_id IS NOT NULL
+GROUP BY LEAST(sender_id, recipient_id), GREATEST(sender_id, recipient_id)
+ON CONFLICT (conversation_key) DO NOTHING;
+
+INSERT INTO conversation_participants (conversation_id, user_id, peer_user_id, unread_count, last_message_at)
+SELECT c.id, p.user_id, p.peer_user_id,
+       (SELECT COUNT(*) FROM messages m
+         WHERE m.recipient_id = p.user_id AND m.sender_id = p.peer_user_id
+           AND m.group_id IS NULL AND m.status <> 'read'),
+       c.last_message_at
+FROM conversations c
+CROSS JOIN LATERAL (
+    VALUES (split_part(c.conversation_key, ':', 2)::INTEGER, split_part(c.conversation_key, ':', 3)::INTEGER),
+           (split_part(c.conversation_key, ':', 3)::INTEGER, split_part(c.conversation_key, ':', 2)::INTEGER)
+) AS p(user_id, peer_user_id)
+WHERE c.conversation_key LIKE 'dm:%'
+ON CONFLICT (conversation_id, user_id) DO NOTHING;
+
+-- Backfill group conversations (unread counts start at zero)
+INSERT INTO conversations (conversation_key, group_id, last_message_id, last_message_at)
+SELECT 'group:' || group_id, group_id, MAX(id), MAX(created_at)
+FROM messages
+WHERE group_id IS NOT NULL
+GROUP BY group_id
+ON CONFLICT (conversation_key) DO NOTHING;
+
+INSERT INTO conversation_participants (conversation_id, user_id, unread_count, last_message_at)
+SELECT c.id, gm.user_id, 0, c.last_message_at
+FROM conversations c
+JOIN group_members gm ON gm.group_id = c.group_id
+WHERE c.group_id IS NOT NULL
+ON CONFLICT (conversation_id, user_id) DO NOTHING;
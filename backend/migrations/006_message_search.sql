@@ -0,0 +1,8 @@
+-- Full-text search over message subject and content
+ALTER TABLE messages
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce(subject, '') || ' ' || coalesce(content, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING GIN (search_vector);
@@ -0,0 +1,3 @@
+-- SHA-256 of uploaded video content, computed while the upload streams to disk
+ALTER TABLE video_recordings ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR(64);
+CREATE INDEX IF NOT EXISTS ix_video_recordings_content_sha256 ON video_recordings(content_sha256);
@@ -0,0 +1,5 @@
+-- Background media processing results for video recordings
+ALTER TABLE video_recordings ADD COLUMN IF NOT EXISTS processing_status VARCHAR DEFAULT 'pending';
+ALTER TABLE video_recordings ADD COLUMN IF NOT EXISTS poster_path VARCHAR;
+ALTER TABLE video_recordings ADD COLUMN IF NOT EXISTS thumbnail_path VARCHAR;
+CREATE INDEX IF NOT EXISTS ix_video_recordings_processing_status ON video_recordings(processing_status);
@@ -0,0 +1,9 @@
+-- Content-addressed storage for uploaded media, reference-counted by video_recordings.content_sha256
+CREATE TABLE IF NOT EXISTS media_blobs (
+    id SERIAL PRIMARY KEY,
+    sha256 VARCHAR(64) UNIQUE NOT NULL,
+    path VARCHAR NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
@@ -0,0 +1,17 @@
+-- Keyset pagination of a patient's recordings and per-patient storage usage counters
+CREATE INDEX IF NOT EXISTS ix_video_recordings_patient_recorded ON video_recordings(patient_id, recorded_at, id);
+
+CREATE TABLE IF NOT EXISTS patient_storage_usage (
+    patient_id INTEGER PRIMARY KEY REFERENCES patients(id),
+    video_count INTEGER NOT NULL DEFAULT 0,
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Seed the counters from existing recordings; maintained incrementally from here on
+INSERT INTO patient_storage_usage (patient_id, video_count, total_bytes)
+SELECT patient_id, COUNT(*), COALESCE(SUM(file_size_bytes), 0)
+FROM video_recordings
+WHERE patient_id IS NOT NULL
+GROUP BY patient_id
+ON CONFLICT (patient_id) DO NOTHING;
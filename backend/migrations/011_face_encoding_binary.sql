@@ -0,0 +1,48 @@
+-- Face encodings as fixed-width little-endian float32 blobs (4 bytes per dimension)
+CREATE TABLE IF NOT EXISTS face_encodings (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    patient_id INTEGER REFERENCES patients(id),
+    encoding BYTEA NOT NULL,
+    image_path VARCHAR,
+    is_active BOOLEAN DEFAULT TRUE,
+    confidence_score DOUBLE PRECISION,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_face_encodings_user_id ON face_encodings(user_id);
+
+-- Convert tables created from the models while encodings were JSON arrays.
+-- float4send() is big-endian, so the four bytes of each value are reversed.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'face_encodings' AND column_name = 'encoding' AND data_type IN ('json', 'jsonb')
+    ) THEN
+        ALTER TABLE face_encodings ADD COLUMN encoding_f32 BYTEA;
+
+        UPDATE face_encodings AS f
+        SET encoding_f32 = packed.blob
+        FROM (
+            SELECT e.id,
+                   string_agg(
+                       substring(s.b FROM 4 FOR 1) || substring(s.b FROM 3 FOR 1) ||
+                       substring(s.b FROM 2 FOR 1) || substring(s.b FROM 1 FOR 1),
+                       ''::bytea ORDER BY t.ord
+                   ) AS blob
+            FROM face_encodings e
+            CROSS JOIN LATERAL json_array_elements_text(e.encoding::json) WITH ORDINALITY AS t(v, ord)
+            CROSS JOIN LATERAL (SELECT float4send(t.v::float4) AS b) AS s
+            GROUP BY e.id
+        ) AS packed
+        WHERE f.id = packed.id;
+        -- Empty arrays have no values to aggregate and can never match; keep the
+        -- rows for the record but take them out of service.
+        UPDATE face_encodings SET encoding_f32 = ''::bytea, is_active = FALSE WHERE encoding_f32 IS NULL;
+
+        ALTER TABLE face_encodings DROP COLUMN encoding;
+        ALTER TABLE face_encodings RENAME COLUMN encoding_f32 TO encoding;
+        ALTER TABLE face_encodings ALTER COLUMN encoding SET NOT NULL;
+    END IF;
+END $$;
@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from database import Base
+from array import array
 from enum import Enum
+import sys
 
 class UserRole(str, Enum):
     PATIENT = "patient"
@@ -23,6 +25,12 @@ class MessageStatus(str, Enum):
     DELIVERED = "delivered"
     READ = "read"
 
+class MediaProcessingStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    READY = "ready"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -117,6 +125,47 @@ class Message(Base):
     recipient = relationship("User", foreign_keys=[recipient_id], back_populates="received_messages")
     group = relationship("Group", back_populates="messages")
 
+    # Composite keys for keyset pagination of inbox/sent/conversation/group views
+    __table_args__ = (
+        Index("ix_messages_recipient_created", "recipient_id", "created_at", "id"),
+        Index("ix_messages_sender_created", "sender_id", "created_at", "id"),
+        Index("ix_messages_pair_created", "sender_id", "recipient_id", "created_at", "id"),
+        Index("ix_messages_group_created", "group_id", "created_at", "id"),
+    )
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_key = Column(String, unique=True, nullable=False)  # "dm:<low>:<high>" or "group:<id>"
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True)
+    last_message_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    last_message = relationship("Message")
+    participants = relationship("ConversationParticipant", back_populates="conversation")
+
+class ConversationParticipant(Base):
+    __tablename__ = "conversation_participants"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    peer_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Other side of a direct conversation
+    unread_count = Column(Integer, default=0, nullable=False)
+    last_read_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)  # Mirrors Conversation for per-user ordering
+    
+    # Relationships
+    conversation = relationship("Conversation", back_populates="participants")
+    
+    __table_args__ = (
+        UniqueConstraint("conversation_id", "user_id", name="uq_conversation_participants_user"),
+        Index("ix_conversation_participants_user_recent", "user_id", "last_message_at"),
+    )
+
 class Group(Base):
     __tablename__ = "groups"
     
@@ -169,10 +218,46 @@ class VideoRecording(Base):
     file_path = Column(String, nullable=False)
     duration_seconds = Column(Integer)
     file_size_bytes = Column(Integer)
+    content_sha256 = Column(String(64), index=True)
+    processing_status = Column(String, default=MediaProcessingStatus.PENDING, index=True)
+    poster_path = Column(String)
+    thumbnail_path = Column(String)
     recorded_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     patient = relationship("Patient", back_populates="video_recordings")
+    
+    __table_args__ = (
+        Index("ix_video_recordings_patient_recorded", "patient_id", "recorded_at", "id"),
+    )
+    
+    @property
+    def has_poster(self) -> bool:
+        return self.poster_path is not None
+    
+    @property
+    def has_thumbnails(self) -> bool:
+        return self.thumbnail_path is not None
+
+class MediaBlob(Base):
+    """One stored copy of an uploaded file, shared by every recording with that content."""
+    __tablename__ = "media_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    path = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class PatientStorageUsage(Base):
+    """Running totals of a patient's recordings, kept in step with uploads and deletes."""
+    __tablename__ = "patient_storage_usage"
+    
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    video_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
@@ -242,7 +327,7 @@ class FaceEncoding(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=True)
-    encoding = Column(JSON, nullable=False)  # Store face encoding as JSON array
+    encoding = Column(LargeBinary, nullable=False)  # Little-endian float32 vector, 4 bytes per dimension
     image_path = Column(String)  # Optional: path to reference image
     is_active = Column(Boolean, default=True)
     confidence_score = Column(Float)  # Quality score of the encoding
@@ -252,6 +337,20 @@ class FaceEncoding(Base):
     # Relationships
     user = relationship("User")
     patient = relationship("Patient")
+    
+    @validates("encoding")
+    def _pack_encoding(self, key, value):
+        return pack_encoding(value)
+
+
+def pack_encoding(values) -> bytes:
+    """Pack a face encoding (any sequence of floats) into its stored float32 form."""
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        return bytes(values)
+    packed = array("f", (float(v) for v in values))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
 
 
 class LocationTracking(Base):
@@ -0,0 +1,73 @@
+"""Keyset (cursor) pagination helpers.
+
+Listings are ordered by ``(<timestamp column>, id)``. A cursor is an opaque
+token naming the last row of the previous page; the next page is everything
+strictly after that row in sort order. The anchor's timestamp is looked up
+by primary key inside the query, which keeps the comparison exact whatever
+precision the backend stored the timestamp with, and lets the composite
+``(..., <timestamp>, id)`` indexes serve every page at first-page cost.
+"""
+
+import base64
+import json
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import select, tuple_
+
+
+def encode_cursor(row_id: int, rank: Optional[float] = None) -> str:
+    """Build an opaque cursor pointing at ``row_id`` (and its relevance rank)."""
+    data = {"id": row_id} if rank is None else {"id": row_id, "rank": rank}
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(data, dict) or not isinstance(data.get("id"), int):
+            raise ValueError("cursor id must be an integer")
+        return data
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the anchor row id of a cursor, or raise 400 if it is malformed."""
+    return _decode(cursor)["id"]
+
+
+def decode_ranked_cursor(cursor: str) -> Tuple[float, int]:
+    """Return ``(rank, id)`` of a cursor produced for a ranked listing."""
+    data = _decode(cursor)
+    rank = data.get("rank")
+    if not isinstance(rank, (int, float)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return float(rank), data["id"]
+
+
+def apply_keyset(stmt, model, sort_column, cursor: Optional[str], descending: bool):
+    """Order ``stmt`` by ``(sort_column, id)`` and start it after ``cursor``."""
+    if cursor:
+        anchor_id = decode_cursor(cursor)
+        anchor_value = select(sort_column).where(model.id == anchor_id).scalar_subquery()
+        key = tuple_(sort_column, model.id)
+        anchor = tuple_(anchor_value, anchor_id)
+        stmt = stmt.where(key < anchor if descending else key > anchor)
+    if descending:
+        return stmt.order_by(sort_column.desc(), model.id.desc())
+    return stmt.order_by(sort_column.asc(), model.id.asc())
+
+
+def set_next_cursor(response: Response, rows: Sequence, limit: int) -> None:
+    """Expose the cursor for the following page in ``X-Next-Cursor``."""
+    if len(rows) == limit and rows:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
@@ -0,0 +1,65 @@
+"""Dedicated executor for bcrypt hashing and verification.
+
+bcrypt is deliberately slow (~200 ms per call) and would stall the event
+loop if run inline in an ``async def`` handler. The C implementation
+releases the GIL, so a small thread pool gives real parallelism. Admission
+is bounded: once ``workers + max_queue`` calls are in flight new calls fail
+immediately with :class:`PasswordHasherBusy` instead of piling up.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="password-hash"
+        )
+        # Only touched from the event loop thread, so a plain int is enough.
+        self._in_flight = 0
+        self._queue_wait = metrics.latency("password_hash.queue_wait")
+        self._hash_time = metrics.latency("password_hash.latency")
+        self._rejected = metrics.counter("password_hash.rejected")
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Run ``func(*args)`` on the hashing pool, failing fast when saturated."""
+        if self._in_flight >= self.workers + self.max_queue:
+            self._rejected.inc()
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        submitted = time.perf_counter()
+
+        def timed() -> T:
+            started = time.perf_counter()
+            self._queue_wait.observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                self._hash_time.observe(time.perf_counter() - started)
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, timed)
+        finally:
+            self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
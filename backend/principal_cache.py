@@ -0,0 +1,136 @@
+"""In-process TTL/LRU cache of authenticated principals.
+
+``get_current_user`` resolves a JWT subject to a ``User`` (plus its patient or
+staff profile) on every request. The cache keeps a detached copy of that
+graph per subject so a warm request can attach it to its session with
+``merge(load=False)`` instead of querying. Entries expire after the
+configured TTL or when the token they were cached under expires, whichever
+comes first, and are dropped whenever a user or profile row is updated or
+deleted in this process. Other workers only notice such changes once their
+own entry expires, so keep the TTL short.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+import metrics
+import models
+
+
+def _detached_copy(obj):
+    """Copy the column state of a loaded instance into a new detached instance."""
+    mapper = inspect(obj).mapper
+    copy = mapper.class_()
+    for attr in mapper.column_attrs:
+        setattr(copy, attr.key, getattr(obj, attr.key))
+    return copy
+
+
+def snapshot_principal(user: models.User) -> models.User:
+    """Build a detached User + role profile graph safe to share across requests."""
+    user_copy = _detached_copy(user)
+    patient = user.patient_profile
+    staff = user.staff_profile
+    patient_copy = _detached_copy(patient) if patient is not None else None
+    staff_copy = _detached_copy(staff) if staff is not None else None
+    user_copy.patient_profile = patient_copy
+    user_copy.staff_profile = staff_copy
+    for profile in (patient_copy, staff_copy):
+        if profile is not None:
+            make_transient_to_detached(profile)
+    make_transient_to_detached(user_copy)
+    return user_copy
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[models.User, float]]" = OrderedDict()
+        self._subjects_by_user_id: Dict[int, str] = {}
+        self._hits = metrics.counter("principal_cache.hits")
+        self._misses = metrics.counter("principal_cache.misses")
+
+    def get(self, subject: str) -> Optional[models.User]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                self._misses.inc()
+                return None
+            user, expires_at = entry
+            if expires_at <= now:
+                self._drop(subject)
+                self._misses.inc()
+                return None
+            self._entries.move_to_end(subject)
+        self._hits.inc()
+        return user
+
+    def put(self, subject: str, user: models.User, token_expires_at: Optional[datetime] = None) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            remaining = (token_expires_at - datetime.now(timezone.utc)).total_seconds()
+            ttl = min(ttl, remaining)
+            if ttl <= 0:
+                return
+        snapshot = snapshot_principal(user)
+        with self._lock:
+            self._drop(subject)
+            self._entries[subject] = (snapshot, time.monotonic() + ttl)
+            self._subjects_by_user_id[snapshot.id] = subject  # type: ignore
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate(self, subject: str) -> None:
+        with self._lock:
+            self._drop(subject)
+
+    def invalidate_user_id(self, user_id: Optional[int]) -> None:
+        if user_id is None:
+            return
+        with self._lock:
+            subject = self._subjects_by_user_id.get(user_id)
+            if subject is not None:
+                self._drop(subject)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._subjects_by_user_id.clear()
+
+    def _drop(self, subject: str) -> None:
+        entry = self._entries.pop(subject, None)
+        if entry is not None:
+            self._subjects_by_user_id.pop(entry[0].id, None)  # type: ignore
+
+
+def install_invalidation_hooks(cache: PrincipalCache) -> None:
+    """Drop cached principals whenever their user or profile rows change."""
+
+    def on_user_change(mapper, connection, target):
+        cache.invalidate_user_id(target.id)
+        # The email (cache key) itself may have changed.
+        history = inspect(target).attrs.email.history
+        for old_email in history.deleted or ():
+            cache.invalidate(old_email)
+
+    def on_profile_change(mapper, connection, target):
+        cache.invalidate_user_id(target.user_id)
+
+    for event_name in ("after_update", "after_delete"):
+        event.listen(models.User, event_name, on_user_change)
+        event.listen(models.Patient, event_name, on_profile_change)
+        event.listen(models.Staff, event_name, on_profile_change)
+    event.listen(models.Patient, "after_insert", on_profile_change)
+    event.listen(models.Staff, "after_insert", on_profile_change)
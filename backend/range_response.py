@@ -0,0 +1,221 @@
+"""Byte-range serving of files from disk (RFC 9110 section 14).
+
+``file_response`` answers conditional and ``Range`` requests for a file with
+``200``, ``206 Partial Content`` (single range or ``multipart/byteranges``),
+``304`` or ``416``. Validators are a strong ETag built from the file size
+and mtime plus ``Last-Modified``; ``If-Range`` falls back to the full body
+when the file has changed. Bodies go out through the ASGI
+``http.response.zerocopysend`` extension (sendfile) when the server offers
+it, otherwise in fixed-size chunks read with anyio.
+"""
+
+import os
+import secrets
+from email.utils import formatdate
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+import metrics
+
+CHUNK_SIZE = 64 * 1024
+# Clients asking for more ranges than this get the whole file instead.
+MAX_RANGES = 16
+
+ByteRange = Tuple[int, int]  # inclusive start, inclusive end
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[ByteRange]]:
+    """Parse a ``bytes=`` range header into sorted, coalesced ranges.
+
+    Returns None when the header is syntactically invalid or asks for too
+    many ranges (the caller then serves the full file), and raises
+    ``UnsatisfiableRange`` when no requested range overlaps the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges: List[ByteRange] = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes.
+                length = int(last)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    if not ranges:
+        raise UnsatisfiableRange()
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+class RangeFileResponse(Response):
+    """Send all of ``path`` or the given byte ranges of it."""
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        ranges: Optional[List[ByteRange]],
+        headers: dict,
+        media_type: str,
+    ):
+        self.path = path
+        self.size = size
+        self.ranges = ranges
+        self.boundary = secrets.token_hex(16)
+        self.parts: List[Tuple[bytes, int, int]] = []
+
+        if ranges is None:
+            status_code = 200
+            content_length = size
+            self.parts.append((b"", 0, size))
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            status_code = 206
+            content_length = end - start + 1
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            self.parts.append((b"", start, content_length))
+        else:
+            status_code = 206
+            content_length = 0
+            for start, end in ranges:
+                preamble = (
+                    f"--{self.boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                self.parts.append((preamble, start, end - start + 1))
+                content_length += len(preamble) + end - start + 1 + 2  # trailing CRLF
+            self.epilogue = f"--{self.boundary}--\r\n".encode("latin-1")
+            content_length += len(self.epilogue)
+            media_type = f"multipart/byteranges; boundary={self.boundary}"
+
+        headers["content-length"] = str(content_length)
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        multipart = len(self.parts) > 1
+        sent = metrics.counter("downloads.bytes")
+        async with await anyio.open_file(self.path, "rb") as file:
+            for index, (preamble, offset, count) in enumerate(self.parts):
+                if preamble:
+                    await send({"type": "http.response.body", "body": preamble, "more_body": True})
+                more_after = multipart or index < len(self.parts) - 1
+                if zero_copy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": file.wrapped,
+                        "offset": offset,
+                        "count": count,
+                        "more_body": more_after,
+                    })
+                else:
+                    await file.seek(offset)
+                    remaining = count
+                    while remaining > 0:
+                        chunk = await file.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            # File was truncated underneath us; end the body.
+                            await send({"type": "http.response.body", "body": b"", "more_body": False})
+                            return
+                        remaining -= len(chunk)
+                        await send({
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": more_after or remaining > 0,
+                        })
+                if multipart:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+                sent.inc(count)
+            if multipart:
+                await send({"type": "http.response.body", "body": self.epilogue, "more_body": False})
+
+
+def file_response(request: Request, path: str, media_type: str, filename: Optional[str] = None) -> Response:
+    """Serve ``path`` honouring ``If-None-Match``, ``Range`` and ``If-Range``.
+
+    With ``filename`` the body is sent as an attachment of that name.
+    """
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = f'"{size:x}-{stat_result.st_mtime_ns:x}"'
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": etag,
+        "last-modified": last_modified,
+    }
+    if filename:
+        headers["content-disposition"] = content_disposition(filename)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    if size == 0:
+        return Response(content=b"", headers=headers, media_type=media_type)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, last_modified)):
+        try:
+            ranges = parse_range_header(range_header, size)
+        except UnsatisfiableRange:
+            metrics.counter("downloads.range_unsatisfiable").inc()
+            return Response(
+                status_code=416,
+                headers={"content-range": f"bytes */{size}", "accept-ranges": "bytes", "etag": etag},
+            )
+    metrics.counter("downloads.ranged" if ranges else "downloads.full").inc()
+    return RangeFileResponse(path, size, ranges, headers, media_type)
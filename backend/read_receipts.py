@@ -0,0 +1,123 @@
+"""Server-side coalescing of read receipts.
+
+Opening a long thread makes clients report reads in quick succession. The
+batcher keeps only the highest message id per (reader, conversation) and
+writes everything that arrived within a short window in one transaction:
+a single ``UPDATE ... WHERE id <= :up_to`` per conversation plus the
+matching unread-counter adjustments.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select, update
+
+import conversations
+import metrics
+import models
+from config import settings
+from database import AsyncSessionLocal
+from realtime import message_hub
+
+logger = logging.getLogger(__name__)
+
+# (reader_id, peer_user_id, group_id) -> highest message id read
+ReceiptKey = Tuple[int, Optional[int], Optional[int]]
+
+
+class ReadReceiptBatcher:
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._pending: Dict[ReceiptKey, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._submitted = metrics.counter("read_receipts.submitted")
+        self._flushes = metrics.latency("read_receipts.flush")
+
+    def submit(self, reader_id: int, up_to_message_id: int,
+               peer_user_id: Optional[int] = None, group_id: Optional[int] = None) -> None:
+        """Record that ``reader_id`` has read everything up to ``up_to_message_id``."""
+        key = (reader_id, peer_user_id, group_id)
+        if self._pending.get(key, 0) < up_to_message_id:
+            self._pending[key] = up_to_message_id
+        self._submitted.inc()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window_seconds)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write every pending receipt in one transaction."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            async with AsyncSessionLocal() as db:
+                for (reader_id, peer_user_id, group_id), up_to in pending.items():
+                    if group_id is not None:
+                        await _apply_group_receipt(db, reader_id, group_id, up_to)
+                    else:
+                        await _apply_direct_receipt(db, reader_id, peer_user_id, up_to)  # type: ignore
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to flush %d read receipts", len(pending))
+            # Put them back so the next flush retries them.
+            for key, up_to in pending.items():
+                if self._pending.get(key, 0) < up_to:
+                    self._pending[key] = up_to
+            return
+        finally:
+            self._flushes.observe(loop.time() - started)
+
+        for (reader_id, peer_user_id, group_id), up_to in pending.items():
+            if peer_user_id is not None:
+                message_hub.publish([peer_user_id], {
+                    "type": "read",
+                    "reader_id": reader_id,
+                    "up_to_message_id": up_to,
+                })
+
+    async def close(self) -> None:
+        """Wait for the scheduled flush (at most one window) and write the rest."""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+
+
+async def _apply_direct_receipt(db, reader_id: int, peer_user_id: int, up_to: int) -> None:
+    result = await db.execute(
+        update(models.Message)
+        .where(
+            models.Message.recipient_id == reader_id,
+            models.Message.sender_id == peer_user_id,
+            models.Message.group_id.is_(None),
+            models.Message.id <= up_to,
+            models.Message.status != models.MessageStatus.READ,
+        )
+        .values(status=models.MessageStatus.READ, read_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await conversations.mark_read(
+        db, reader_id, conversations.direct_key(reader_id, peer_user_id), result.rowcount, up_to
+    )
+
+
+async def _apply_group_receipt(db, reader_id: int, group_id: int, up_to: int) -> None:
+    # Group messages carry no per-reader status; recount what is left unread.
+    remaining = await db.scalar(
+        select(func.count(models.Message.id)).where(
+            models.Message.group_id == group_id,
+            models.Message.id > up_to,
+            models.Message.sender_id != reader_id,
+        )
+    )
+    await conversations.set_unread(
+        db, reader_id, conversations.group_key(group_id), remaining or 0, up_to
+    )
+
+
+read_receipts = ReadReceiptBatcher(settings.read_receipt_window_ms / 1000)
@@ -0,0 +1,89 @@
+"""In-process pub/sub hub for pushing new messages to connected clients.
+
+Each WebSocket connection owns a :class:`Subscription` with a bounded
+queue. Publishing never blocks the sender: if a subscriber's queue is full
+the subscriber is marked as lagging, its backlog is discarded and the
+connection is closed so the client can reconnect and catch up through the
+REST listings (which support cursors). The hub only reaches connections
+held by the current worker process.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+
+import metrics
+from config import settings
+
+
+class TooManyConnections(Exception):
+    """Raised when a user already holds the maximum number of connections."""
+
+
+class Subscription:
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Queue ``event`` without waiting; returns False if the subscriber lagged."""
+        if self.lagged:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.lagged = True
+            # Drop the backlog and leave a sentinel so the writer shuts down.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+    async def next_event(self) -> Optional[Dict[str, Any]]:
+        """Wait for the next event; ``None`` means the subscription lagged."""
+        return await self.queue.get()
+
+
+class MessageHub:
+    def __init__(self, queue_size: int, max_connections_per_user: int):
+        self.queue_size = queue_size
+        self.max_connections_per_user = max_connections_per_user
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._published = metrics.counter("realtime.events_published")
+        self._dropped = metrics.counter("realtime.deliveries_dropped")
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subs = self._subscribers[user_id]
+        if len(subs) >= self.max_connections_per_user:
+            raise TooManyConnections(f"User {user_id} has too many open connections")
+        sub = Subscription(user_id, self.queue_size)
+        subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.user_id)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[sub.user_id]
+
+    def connection_count(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, user_ids: Iterable[int], event: Dict[str, Any]) -> int:
+        """Fan ``event`` out to every connection of ``user_ids``; returns deliveries."""
+        delivered = 0
+        for user_id in set(user_ids):
+            for sub in list(self._subscribers.get(user_id, ())):
+                if sub.offer(event):
+                    delivered += 1
+                else:
+                    self._dropped.inc()
+        self._published.inc()
+        return delivered
+
+
+message_hub = MessageHub(settings.realtime_queue_size, settings.realtime_max_connections_per_user)
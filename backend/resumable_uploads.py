@@ -0,0 +1,210 @@
+"""Resumable uploads kept on local disk.
+
+A session is a directory under ``<upload_dir>/.sessions/<id>/`` holding
+``meta.json`` (owner, declared size, recording details) and ``data.part``
+(the bytes received so far). The current offset is simply the size of
+``data.part``, so a session survives a worker restart and a dropped
+connection keeps whatever was written before it broke. Chunks must be
+sent at the current offset; concurrent writers to the same session are
+refused with 409. Sessions live next to the final upload directory, so
+finalizing is an atomic rename.
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import aiofiles
+from fastapi import HTTPException, status
+
+import metrics
+import schemas
+from config import settings
+from file_locks import try_lock, unlock
+from media_uploads import StoredUpload, adopt_file
+
+SESSIONS_DIR = os.path.join(settings.upload_dir, ".sessions")
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+@dataclass
+class UploadSessionMeta:
+    id: str
+    user_id: int
+    patient_id: int
+    title: Optional[str]
+    description: Optional[str]
+    filename: Optional[str]
+    content_type: str
+    total_size: int
+    created_at: float
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(SESSIONS_DIR, self.id)
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.directory, "data.part")
+
+    def offset(self) -> int:
+        return os.path.getsize(self.data_path)
+
+    def last_activity(self) -> float:
+        return max(self.created_at, os.path.getmtime(self.data_path))
+
+    def expires_at(self) -> datetime:
+        expiry = self.last_activity() + settings.upload_session_ttl_hours * 3600
+        return datetime.fromtimestamp(expiry, tz=timezone.utc)
+
+    def to_schema(self) -> schemas.UploadSession:
+        return schemas.UploadSession(
+            id=self.id,
+            offset=self.offset(),
+            total_size=self.total_size,
+            expires_at=self.expires_at(),
+        )
+
+
+def _not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Upload session not found"
+    )
+
+
+def _offset_conflict(detail: str, offset: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=detail,
+        headers={"Upload-Offset": str(offset)}
+    )
+
+
+def _read_meta(session_id: str) -> Optional[UploadSessionMeta]:
+    try:
+        with open(os.path.join(SESSIONS_DIR, session_id, "meta.json")) as f:
+            return UploadSessionMeta(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _is_expired(meta: UploadSessionMeta) -> bool:
+    try:
+        return meta.expires_at().timestamp() < time.time()
+    except OSError:
+        return True
+
+
+def purge_expired_sessions() -> int:
+    """Remove sessions idle for longer than the configured TTL."""
+    if not os.path.isdir(SESSIONS_DIR):
+        return 0
+    removed = 0
+    for session_id in os.listdir(SESSIONS_DIR):
+        meta = _read_meta(session_id)
+        if meta is None or _is_expired(meta):
+            shutil.rmtree(os.path.join(SESSIONS_DIR, session_id), ignore_errors=True)
+            removed += 1
+    if removed:
+        metrics.counter("uploads.sessions_expired").inc(removed)
+    return removed
+
+
+def create_session(user_id: int, patient_id: int, request: schemas.UploadSessionCreate) -> UploadSessionMeta:
+    if request.total_size > settings.max_file_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum limit of {settings.max_file_size} bytes"
+        )
+    purge_expired_sessions()
+
+    meta = UploadSessionMeta(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        patient_id=patient_id,
+        title=request.title,
+        description=request.description,
+        filename=request.filename,
+        content_type=request.content_type,
+        total_size=request.total_size,
+        created_at=time.time(),
+    )
+    os.makedirs(meta.directory)
+    open(meta.data_path, "wb").close()
+    temp_meta = os.path.join(meta.directory, "meta.json.tmp")
+    with open(temp_meta, "w") as f:
+        json.dump(asdict(meta), f)
+    os.replace(temp_meta, os.path.join(meta.directory, "meta.json"))
+    metrics.counter("uploads.sessions_created").inc()
+    return meta
+
+
+def get_session(session_id: str, user_id: int) -> UploadSessionMeta:
+    """Load a live session owned by ``user_id`` or raise 404."""
+    if not _SESSION_ID.match(session_id):
+        raise _not_found()
+    meta = _read_meta(session_id)
+    if meta is None or meta.user_id != user_id or _is_expired(meta):
+        raise _not_found()
+    return meta
+
+
+async def append_chunk(meta: UploadSessionMeta, offset: int, body: AsyncIterator[bytes]) -> int:
+    """Append ``body`` at ``offset`` and return the new offset.
+
+    The offset must equal the bytes already stored. If the client goes away
+    mid-chunk, what was received is kept and the next request resumes from
+    there.
+    """
+    async with aiofiles.open(meta.data_path, "ab") as out:
+        if not try_lock(out.fileno()):
+            raise _offset_conflict("Another chunk is being written to this session", meta.offset())
+        try:
+            return await _write_chunk(meta, out, offset, body)
+        finally:
+            unlock(out.fileno())
+
+
+async def _write_chunk(meta: UploadSessionMeta, out, offset: int, body: AsyncIterator[bytes]) -> int:
+    current = os.path.getsize(meta.data_path)
+    if offset != current:
+        raise _offset_conflict("Upload-Offset does not match the stored offset", current)
+
+    written = 0
+    async for chunk in body:
+        if not chunk:
+            continue
+        if current + written + len(chunk) > meta.total_size:
+            await out.flush()
+            os.truncate(meta.data_path, current)
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Chunk extends past the declared upload size"
+            )
+        await out.write(chunk)
+        written += len(chunk)
+    await out.flush()
+    metrics.counter("uploads.session_bytes").inc(written)
+    return current + written
+
+
+async def complete_session(meta: UploadSessionMeta, directory: str) -> StoredUpload:
+    """Move the assembled file into ``directory`` (same filesystem) and drop the session."""
+    offset = meta.offset()
+    if offset != meta.total_size:
+        raise _offset_conflict("Upload is incomplete", offset)
+    extension = os.path.splitext(meta.filename or "")[1]
+    stored = await adopt_file(meta.data_path, directory, extension)
+    discard_session(meta)
+    return stored
+
+
+def discard_session(meta: UploadSessionMeta) -> None:
+    shutil.rmtree(meta.directory, ignore_errors=True)
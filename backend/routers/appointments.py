@@ -1,7 +1,8 @@
 from typing import List, Optional
 from datetime import datetime, date
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 import models
 import schemas
@@ -22,7 +23,7 @@ async def create_appointment(
             ]
         )
     ),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new appointment.
 
@@ -32,7 +33,7 @@ async def create_appointment(
     # Get patient from current user if they're a patient, or from appointment data if staff
     user_role: models.UserRole = current_user.role  # type: ignore
     if user_role == models.UserRole.PATIENT:
-        patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+        patient: Optional[models.Patient] = current_user.patient_profile
         if not patient:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -45,7 +46,7 @@ async def create_appointment(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="patient_id is required for staff-created appointments"
             )
-        patient = db.query(models.Patient).filter(models.Patient.id == appointment.patient_id).first()
+        patient = await db.get(models.Patient, appointment.patient_id)
         if not patient:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -63,8 +64,8 @@ async def create_appointment(
     )
     
     db.add(db_appointment)
-    db.commit()
-    db.refresh(db_appointment)
+    await db.commit()
+    await db.refresh(db_appointment)
     return db_appointment
 
 @router.get("/my-appointments", response_model=List[schemas.Appointment])
@@ -72,31 +73,32 @@ async def get_my_appointments(
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's appointments."""
-    query = db.query(models.Appointment)
+    query = select(models.Appointment)
     
     user_role: models.UserRole = current_user.role  # type: ignore
     if user_role == models.UserRole.PATIENT:
-        patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+        patient: Optional[models.Patient] = current_user.patient_profile
         if not patient:
             return []
         patient_id: int = patient.id  # type: ignore
-        query = query.filter(models.Appointment.patient_id == patient_id)
+        query = query.where(models.Appointment.patient_id == patient_id)
     else:
         # For staff, get appointments they're assigned to
-        staff: Optional[models.Staff] = db.query(models.Staff).filter(models.Staff.user_id == current_user.id).first()
+        staff: Optional[models.Staff] = current_user.staff_profile
         if not staff:
             return []
-        query = query.filter(models.Appointment.staff_id == staff.id)
+        query = query.where(models.Appointment.staff_id == staff.id)
     
     if start_date:
-        query = query.filter(models.Appointment.scheduled_datetime >= start_date)
+        query = query.where(models.Appointment.scheduled_datetime >= start_date)
     if end_date:
-        query = query.filter(models.Appointment.scheduled_datetime <= end_date)
+        query = query.where(models.Appointment.scheduled_datetime <= end_date)
     
-    appointments = query.order_by(models.Appointment.scheduled_datetime).all()
+    result = await db.execute(query.order_by(models.Appointment.scheduled_datetime))
+    appointments = result.scalars().all()
     return appointments
 
 @router.put("/{appointment_id}/status")
@@ -104,10 +106,10 @@ async def update_appointment_status(
     appointment_id: int,
     appointment_status: models.AppointmentStatus,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update appointment status."""
-    appointment: Optional[models.Appointment] = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
+    appointment: Optional[models.Appointment] = await db.get(models.Appointment, appointment_id)
     if not appointment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -117,7 +119,7 @@ async def update_appointment_status(
     # Check permissions
     user_role: models.UserRole = current_user.role  # type: ignore
     if user_role == models.UserRole.PATIENT:
-        patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+        patient: Optional[models.Patient] = current_user.patient_profile
         patient_id: int = appointment.patient_id  # type: ignore
         if not patient or patient_id != patient.id:
             raise HTTPException(
@@ -126,5 +128,5 @@ async def update_appointment_status(
             )
     
     setattr(appointment, 'status', appointment_status)
-    db.commit()
+    await db.commit()
     return {"message": "Appointment status updated successfully"}
@@ -2,34 +2,38 @@ from datetime import timedelta
 from typing import Optional, Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 import models
 import schemas
-from auth import authenticate_user, create_access_token, get_password_hash, get_current_active_user
+from auth import authenticate_user, create_access_token, get_password_hash_async, verify_password_async, get_current_active_user, principal_cache
 from config import settings
 from supabase_client import supabase_client
 
 router = APIRouter()
 
 @router.post("/register", response_model=schemas.User)
-async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user with Supabase integration."""
     # Check if user already exists in local database
-    db_user: Optional[models.User] = db.query(models.User).filter(models.User.email == user.email).first()
+    result = await db.execute(select(models.User).where(models.User.email == user.email))
+    db_user: Optional[models.User] = result.scalars().first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
+    hashed_password = await get_password_hash_async(user.password)
+    
     # Try to create patient in Supabase if available
     supabase_patient = None
     if supabase_client.is_available():
         try:
             supabase_patient = await supabase_client.create_patient({
                 "email": user.email,
-                "password_hash": get_password_hash(user.password),
+                "password_hash": hashed_password,
                 "full_name": f"{user.first_name} {user.last_name}",
                 "phone_number": user.phone,
                 "is_active": True
@@ -39,7 +43,6 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db))
             print(f"Supabase registration failed: {e}")
     
     # Create new user in local database
-    hashed_password = get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -50,8 +53,8 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db))
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Create patient profile if user is a patient
     user_role: models.UserRole = user.role  # type: ignore
@@ -62,7 +65,7 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db))
             patient_id=patient_id
         )
         db.add(db_patient)
-        db.commit()
+        await db.commit()
     
     # Create staff profile if user is staff
     elif user_role in [models.UserRole.DOCTOR, models.UserRole.NURSE, models.UserRole.COUNSELOR]:
@@ -72,12 +75,12 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db))
             staff_id=staff_id
         )
         db.add(db_staff)
-        db.commit()
+        await db.commit()
     
     return db_user
 
 @router.post("/login", response_model=schemas.Token)
-async def login_user(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
+async def login_user(login_data: schemas.LoginRequest, db: AsyncSession = Depends(get_db)):
     """Login user with Supabase verification."""
     # First try Supabase authentication if available
     if supabase_client.is_available():
@@ -85,8 +88,7 @@ async def login_user(login_data: schemas.LoginRequest, db: Session = Depends(get
             supabase_patient = await supabase_client.get_patient_by_email(login_data.email)
             if supabase_patient:
                 # Verify password against Supabase record
-                from auth import verify_password
-                if verify_password(login_data.password, supabase_patient.get('password_hash', '')):
+                if await verify_password_async(login_data.password, supabase_patient.get('password_hash', '')):
                     # Update last login in Supabase
                     await supabase_client.update_patient(
                         supabase_patient['id'], 
@@ -96,7 +98,7 @@ async def login_user(login_data: schemas.LoginRequest, db: Session = Depends(get
             print(f"Supabase login check failed: {e}")
     
     # Continue with local authentication
-    user = authenticate_user(db, login_data.email, login_data.password)
+    user = await authenticate_user(db, login_data.email, login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -118,10 +120,10 @@ async def login_user(login_data: schemas.LoginRequest, db: Session = Depends(get
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """OAuth2 compatible token login."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -149,7 +151,7 @@ async def read_users_me(current_user: Annotated[models.User, Depends(get_current
 async def update_user_me(
     user_update: schemas.UserUpdate,
     current_user: Annotated[models.User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> schemas.User:
     """Update current user information."""
     if user_update.first_name is not None:
@@ -159,8 +161,9 @@ async def update_user_me(
     if user_update.phone is not None:
         setattr(current_user, 'phone', user_update.phone)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    principal_cache.invalidate(current_user.email)  # type: ignore
+    await db.refresh(current_user)
     return schemas.User.model_validate(current_user)
 
 @router.post("/change-password")
@@ -168,20 +171,19 @@ async def change_password(
     current_password: str,
     new_password: str,
     current_user: Annotated[models.User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Change user password."""
-    from auth import verify_password
-    
     hashed_password: str = current_user.hashed_password  # type: ignore
-    if not verify_password(current_password, hashed_password):
+    if not await verify_password_async(current_password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect current password"
         )
     
-    setattr(current_user, 'hashed_password', get_password_hash(new_password))
-    db.commit()
+    setattr(current_user, 'hashed_password', await get_password_hash_async(new_password))
+    await db.commit()
+    principal_cache.invalidate(current_user.email)  # type: ignore
     
     return {"message": "Password changed successfully"}
 
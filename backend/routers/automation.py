@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import List, Optional
 import asyncio
@@ -23,27 +24,27 @@ router = APIRouter(prefix="/automation", tags=["automation"])
 @router.post("/schedule-reminders")
 async def schedule_appointment_reminders(
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_patient: Patient = Depends(get_current_patient),
 ):
     """Schedule automated reminders for upcoming appointments"""
 
     # Get upcoming appointments for the patient
-    upcoming_appointments = (
-        db.query(Appointment)
-        .filter(
+    result = await db.execute(
+        select(Appointment)
+        .where(
             Appointment.patient_id == current_patient.id,
             Appointment.scheduled_datetime >= datetime.now(),
         )
-        .all()
     )
+    upcoming_appointments = result.scalars().all()
 
     scheduled_count = 0
 
     for appointment in upcoming_appointments:
         # Get patient's reminder settings
         patient_id: int = current_patient.id  # type: ignore
-        settings = get_reminder_settings(db, patient_id)
+        settings = await get_reminder_settings(db, patient_id)
 
         for days_before in settings.days_before:
             days_before_value: float = days_before  # type: ignore
@@ -86,18 +87,18 @@ async def schedule_appointment_reminders(
 
 @router.get("/reminders", response_model=List[ReminderResponse])
 async def get_active_reminders(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_patient: Patient = Depends(get_current_patient),
 ):
     """Get all active reminders for the current patient"""
     patient_id: int = current_patient.id  # type: ignore
-    reminders: List[Reminder] = (
-        db.query(Reminder)
-        .filter(
+    result = await db.execute(
+        select(Reminder)
+        .where(
             Reminder.patient_id == patient_id, Reminder.status == "scheduled"
         )
-        .all()
     )
+    reminders: List[Reminder] = list(result.scalars().all())
 
     return reminders
 
@@ -105,18 +106,18 @@ async def get_active_reminders(
 @router.post("/reminders/settings")
 async def update_reminder_settings(
     settings: ReminderSettingsSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_patient: Patient = Depends(get_current_patient),
 ):
     """Update patient's reminder preferences"""
 
     # Update or create reminder settings
     patient_id: int = current_patient.id  # type: ignore
-    existing_settings: Optional[ReminderSettingsModel] = (
-        db.query(ReminderSettingsModel)
-        .filter(ReminderSettingsModel.patient_id == patient_id)
-        .first()
+    result = await db.execute(
+        select(ReminderSettingsModel)
+        .where(ReminderSettingsModel.patient_id == patient_id)
     )
+    existing_settings: Optional[ReminderSettingsModel] = result.scalars().first()
 
     if existing_settings:
         for key, value in settings.dict().items():
@@ -127,7 +128,7 @@ async def update_reminder_settings(
         )
         db.add(new_settings)
 
-    db.commit()
+    await db.commit()
     return {"message": "Reminder settings updated successfully"}
 
 
@@ -157,13 +158,13 @@ async def schedule_sms_reminder(appointment_id: int, phone: str, send_time: date
         print(f"Sending SMS reminder to {phone} for appointment {appointment_id}")
 
 
-def get_reminder_settings(db: Session, patient_id: int):
+async def get_reminder_settings(db: AsyncSession, patient_id: int):
     """Get patient's reminder settings with defaults"""
-    settings: Optional[ReminderSettingsModel] = (
-        db.query(ReminderSettingsModel)
-        .filter(ReminderSettingsModel.patient_id == patient_id)
-        .first()
+    result = await db.execute(
+        select(ReminderSettingsModel)
+        .where(ReminderSettingsModel.patient_id == patient_id)
     )
+    settings: Optional[ReminderSettingsModel] = result.scalars().first()
 
     if not settings:
         # Return default settings
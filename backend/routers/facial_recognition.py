@@ -0,0 +1,246 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+import models
+import schemas
+from auth import get_current_active_user, require_role
+from config import settings
+from face_matching import FaceMatch, face_matcher
+from face_pipeline import (
+    FaceDetection, FacePipelineBusy, FacePipelineUnavailable, ImageRejected, ImageTooLarge, face_pipeline
+)
+
+router = APIRouter()
+
+STAFF_ROLES = [models.UserRole.DOCTOR, models.UserRole.NURSE, models.UserRole.COUNSELOR, models.UserRole.ADMIN]
+
+def _is_staff(user: models.User) -> bool:
+    return user.role in STAFF_ROLES
+
+def _busy_or_unavailable(exc: Exception) -> HTTPException:
+    if isinstance(exc, FacePipelineBusy):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Facial recognition is not available"
+    )
+
+def _check_claim(current_user: models.User, user_id: Optional[int], patient_id: Optional[int]) -> None:
+    """Non-staff may only claim to be themselves."""
+    if _is_staff(current_user):
+        return
+    own_patient = current_user.patient_profile
+    if (user_id is not None and user_id != current_user.id) or (
+        patient_id is not None and (own_patient is None or patient_id != own_patient.id)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+def _verification(matches: List[FaceMatch]) -> schemas.FaceVerificationResponse:
+    if not matches:
+        return schemas.FaceVerificationResponse(verified=False, confidence=0.0, message="Face does not match")
+    best = matches[0]
+    return schemas.FaceVerificationResponse(
+        verified=True,
+        confidence=best.confidence,
+        matched_user_id=best.user_id,
+        matched_patient_id=best.patient_id,
+        message="Face verified"
+    )
+
+async def _detect(image_data: str) -> FaceDetection:
+    """Run the detection pipeline, mapping its failures onto HTTP errors."""
+    try:
+        return await face_pipeline.detect(image_data)
+    except ImageTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(exc)
+        )
+    except ImageRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    except (FacePipelineBusy, FacePipelineUnavailable) as exc:
+        raise _busy_or_unavailable(exc)
+
+@router.post("/enroll", response_model=schemas.FaceEncodingResponse, status_code=status.HTTP_201_CREATED)
+async def enroll_face(
+    enrollment: schemas.FaceEnrollmentRequest,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Enroll a face for the current user, or for a patient when called by staff."""
+    user_id: int = current_user.id  # type: ignore
+    patient_id: Optional[int] = None
+    if current_user.role == models.UserRole.PATIENT:
+        if current_user.patient_profile:
+            patient_id = current_user.patient_profile.id  # type: ignore
+    elif enrollment.patient_id is not None:
+        if not _is_staff(current_user):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions"
+            )
+        patient = await db.get(models.Patient, enrollment.patient_id)
+        if not patient:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Patient not found"
+            )
+        user_id, patient_id = patient.user_id, patient.id  # type: ignore
+
+    detection = await _detect(enrollment.image_data)
+    if len(detection.encodings) != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected exactly one face, found {len(detection.encodings)}"
+        )
+
+    db_encoding = models.FaceEncoding(
+        user_id=user_id,
+        patient_id=patient_id,
+        encoding=detection.encodings[0],
+        image_path=enrollment.image_path
+    )
+    db.add(db_encoding)
+    await db.commit()
+    await db.refresh(db_encoding)
+    return db_encoding
+
+@router.post("/verify", response_model=schemas.FaceVerificationResponse)
+async def verify_face(
+    verification: schemas.FaceVerificationRequest,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Check a face against one claimed user or patient (the caller by default)."""
+    user_id, patient_id = verification.user_id, verification.patient_id
+    if user_id is None and patient_id is None:
+        user_id = current_user.id  # type: ignore
+    else:
+        _check_claim(current_user, user_id, patient_id)
+
+    detection = await _detect(verification.image_data)
+    if not detection.encodings:
+        return schemas.FaceVerificationResponse(verified=False, confidence=0.0, message="No face detected")
+
+    await face_matcher.ensure_loaded(db)
+    matches = face_matcher.match_many(
+        detection.encodings[:1], settings.face_match_threshold, k=1,
+        user_ids=[user_id], patient_ids=[patient_id]
+    )[0]
+    return _verification(matches)
+
+@router.post("/verify/batch", response_model=schemas.FaceBatchVerificationResponse)
+async def verify_faces_batch(
+    batch: schemas.FaceBatchVerificationRequest,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Verify several faces at once, e.g. a kiosk or a group session check-in.
+
+    Each item is checked like ``/verify``, except that staff may leave the
+    claim empty to identify the face against everyone enrolled. Images are
+    detected in one pass over the worker pool and compared in a single
+    matrix operation; a bad image only fails its own item.
+    """
+    if len(batch.items) > settings.face_batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.face_batch_max_items} images per batch"
+        )
+    claims = []
+    for item in batch.items:
+        user_id, patient_id = item.user_id, item.patient_id
+        if user_id is None and patient_id is None and not _is_staff(current_user):
+            user_id = current_user.id  # type: ignore
+        else:
+            _check_claim(current_user, user_id, patient_id)
+        claims.append((user_id, patient_id))
+
+    try:
+        detections = await face_pipeline.detect_many([item.image_data for item in batch.items])
+    except (FacePipelineBusy, FacePipelineUnavailable) as exc:
+        raise _busy_or_unavailable(exc)
+
+    results: List[Optional[schemas.FaceVerificationResponse]] = [None] * len(detections)
+    found = []
+    for position, detection in enumerate(detections):
+        if isinstance(detection, ImageRejected):
+            results[position] = schemas.FaceVerificationResponse(verified=False, confidence=0.0, message=str(detection))
+        elif not detection.encodings:
+            results[position] = schemas.FaceVerificationResponse(verified=False, confidence=0.0, message="No face detected")
+        else:
+            found.append(position)
+
+    if found:
+        await face_matcher.ensure_loaded(db)
+        matches = face_matcher.match_many(
+            [detections[position].encodings[0] for position in found],  # type: ignore[union-attr]
+            settings.face_match_threshold, k=1,
+            user_ids=[claims[position][0] for position in found],
+            patient_ids=[claims[position][1] for position in found],
+        )
+        for position, item_matches in zip(found, matches):
+            results[position] = _verification(item_matches)
+    return schemas.FaceBatchVerificationResponse(results=results)
+
+@router.post("/match", response_model=schemas.FaceMatchResponse)
+async def match_face(
+    match_request: schemas.FaceMatchRequest,
+    current_user: models.User = Depends(require_role(STAFF_ROLES)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Identify a face against every enrolled encoding (1:N)."""
+    detection = await _detect(match_request.image_data)
+    if not detection.encodings:
+        return schemas.FaceMatchResponse(matches=[])
+
+    await face_matcher.ensure_loaded(db)
+    matches = face_matcher.match(detection.encodings[0], match_request.threshold, k=settings.face_match_top_k)
+    results = [match.to_dict() for match in matches]
+    return schemas.FaceMatchResponse(matches=results, best_match=results[0] if results else None)
+
+@router.get("/encodings", response_model=List[schemas.FaceEncodingResponse])
+async def get_my_face_encodings(
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the current user's enrolled faces."""
+    result = await db.execute(select(models.FaceEncoding).where(
+        models.FaceEncoding.user_id == current_user.id
+    ).order_by(models.FaceEncoding.created_at.desc()))
+    return list(result.scalars().all())
+
+@router.delete("/encodings/{encoding_id}")
+async def deactivate_face_encoding(
+    encoding_id: int,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Deactivate an enrolled face so it no longer matches."""
+    encoding: Optional[models.FaceEncoding] = await db.get(models.FaceEncoding, encoding_id)
+    if not encoding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Face encoding not found"
+        )
+    if encoding.user_id != current_user.id and current_user.role != models.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    encoding.is_active = False  # type: ignore
+    await db.commit()
+    return {"message": "Face encoding deactivated"}
@@ -1,10 +1,13 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 import models
 import schemas
 from auth import get_current_active_user, require_role
+from pagination import apply_keyset, set_next_cursor
+import conversations
 
 router = APIRouter()
 
@@ -12,7 +15,7 @@ router = APIRouter()
 async def create_group(
     group: schemas.GroupCreate,
     current_user: models.User = Depends(require_role([models.UserRole.DOCTOR, models.UserRole.COUNSELOR, models.UserRole.ADMIN])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new group (staff only)."""
     db_group = models.Group(
@@ -23,8 +26,8 @@ async def create_group(
     )
     
     db.add(db_group)
-    db.commit()
-    db.refresh(db_group)
+    await db.commit()
+    await db.refresh(db_group)
     
     # Add creator as moderator
     db_member = models.GroupMember(
@@ -33,20 +36,21 @@ async def create_group(
         is_moderator=True
     )
     db.add(db_member)
-    db.commit()
+    await db.commit()
     
     return db_group
 
 @router.get("/my-groups", response_model=List[schemas.Group])
 async def get_my_groups(
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get groups that current user is a member of."""
-    groups = db.query(models.Group).join(models.GroupMember).filter(
+    result = await db.execute(select(models.Group).join(models.GroupMember).where(
         models.GroupMember.user_id == current_user.id,
         models.Group.is_active == True
-    ).all()
+    ))
+    groups = result.scalars().all()
     
     return groups
 
@@ -54,11 +58,11 @@ async def get_my_groups(
 async def join_group(
     group_id: int,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Join a group."""
     # Check if group exists
-    group = db.query(models.Group).filter(models.Group.id == group_id).first()
+    group = await db.get(models.Group, group_id)
     if not group:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -66,10 +70,11 @@ async def join_group(
         )
     
     # Check if already a member
-    existing_member = db.query(models.GroupMember).filter(
+    result = await db.execute(select(models.GroupMember).where(
         models.GroupMember.group_id == group_id,
         models.GroupMember.user_id == current_user.id
-    ).first()
+    ))
+    existing_member = result.scalars().first()
     
     if existing_member:
         raise HTTPException(
@@ -84,7 +89,7 @@ async def join_group(
     )
     
     db.add(db_member)
-    db.commit()
+    await db.commit()
     
     return {"message": "Successfully joined group"}
 
@@ -92,13 +97,14 @@ async def join_group(
 async def leave_group(
     group_id: int,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Leave a group."""
-    member = db.query(models.GroupMember).filter(
+    result = await db.execute(select(models.GroupMember).where(
         models.GroupMember.group_id == group_id,
         models.GroupMember.user_id == current_user.id
-    ).first()
+    ))
+    member = result.scalars().first()
     
     if not member:
         raise HTTPException(
@@ -106,25 +112,32 @@ async def leave_group(
             detail="You are not a member of this group"
         )
     
-    db.delete(member)
-    db.commit()
+    await db.delete(member)
+    await conversations.remove_participant(db, current_user.id, conversations.group_key(group_id))  # type: ignore
+    await db.commit()
     
     return {"message": "Successfully left group"}
 
 @router.get("/{group_id}/messages", response_model=List[schemas.Message])
 async def get_group_messages(
     group_id: int,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from a previous page's X-Next-Cursor header"),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get messages from a group."""
+    """Get messages from a group.
+
+    Pass ``cursor`` to page by keyset; ``skip`` is only applied without one.
+    """
     # Verify user is a member of the group
-    member = db.query(models.GroupMember).filter(
+    result = await db.execute(select(models.GroupMember).where(
         models.GroupMember.group_id == group_id,
         models.GroupMember.user_id == current_user.id
-    ).first()
+    ))
+    member = result.scalars().first()
     
     if not member:
         raise HTTPException(
@@ -132,9 +145,15 @@ async def get_group_messages(
             detail="You are not a member of this group"
         )
     
-    messages = db.query(models.Message).filter(
+    stmt = select(models.Message).where(
         models.Message.group_id == group_id
-    ).order_by(models.Message.created_at.asc()).offset(skip).limit(limit).all()
+    )
+    stmt = apply_keyset(stmt, models.Message, models.Message.created_at, cursor, descending=False)
+    if not cursor:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit))
+    messages = list(result.scalars().all())
+    set_next_cursor(response, messages, limit)
     
     return messages
 
@@ -142,14 +161,15 @@ async def get_group_messages(
 async def get_group_members(
     group_id: int,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get members of a group."""
     # Verify user is a member of the group
-    member = db.query(models.GroupMember).filter(
+    result = await db.execute(select(models.GroupMember).where(
         models.GroupMember.group_id == group_id,
         models.GroupMember.user_id == current_user.id
-    ).first()
+    ))
+    member = result.scalars().first()
     
     if not member:
         raise HTTPException(
@@ -157,26 +177,28 @@ async def get_group_members(
             detail="You are not a member of this group"
         )
     
-    members = db.query(models.User).join(models.GroupMember).filter(
+    result = await db.execute(select(models.User).join(models.GroupMember).where(
         models.GroupMember.group_id == group_id
-    ).all()
+    ))
+    members = result.scalars().all()
     
     return members
 
 @router.get("/available", response_model=List[schemas.Group])
 async def get_available_groups(
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get groups available to join."""
     # Get groups user is not already a member of
-    joined_group_ids = db.query(models.GroupMember.group_id).filter(
+    joined_group_ids = select(models.GroupMember.group_id).where(
         models.GroupMember.user_id == current_user.id
-    ).subquery()
+    )
     
-    available_groups: List[models.Group] = db.query(models.Group).filter(
+    result = await db.execute(select(models.Group).where(
         models.Group.is_active == True,
         ~models.Group.id.in_(joined_group_ids)  # type: ignore
-    ).all()
+    ))
+    available_groups: List[models.Group] = list(result.scalars().all())
     
     return available_groups
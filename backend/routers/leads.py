@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 import models, schemas
 
 router = APIRouter()
 
 @router.post("/", response_model=schemas.Lead)
-async def create_lead(lead: schemas.LeadCreate, db: Session = Depends(get_db)):
+async def create_lead(lead: schemas.LeadCreate, db: AsyncSession = Depends(get_db)):
     db_lead = models.Lead(
         first_name=lead.first_name,
         last_name=lead.last_name,
@@ -16,6 +16,6 @@ async def create_lead(lead: schemas.LeadCreate, db: Session = Depends(get_db)):
         message=lead.message,
     )
     db.add(db_lead)
-    db.commit()
-    db.refresh(db_lead)
+    await db.commit()
+    await db.refresh(db_lead)
     return db_lead
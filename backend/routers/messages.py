@@ -1,11 +1,18 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, or_
-from database import get_db
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, WebSocket
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from database import get_db, AsyncSessionLocal
 import models
 import schemas
-from auth import get_current_active_user, require_role
+from auth import get_current_active_user, require_role, decode_access_token, get_current_user
+from pagination import apply_keyset, set_next_cursor, decode_cursor, encode_cursor
+from realtime import message_hub, TooManyConnections
+import conversations
+from read_receipts import read_receipts
+from message_search import build_search_query
 
 router = APIRouter()
 
@@ -13,7 +20,7 @@ router = APIRouter()
 async def send_message(
     message: schemas.MessageCreate,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Send a message to another user or group."""
     # Validate that either recipient_id or group_id is provided
@@ -31,12 +38,13 @@ async def send_message(
     
     # If sending to a group, verify user is a member
     if message.group_id:
-        group_member: Optional[models.GroupMember] = db.query(models.GroupMember).filter(
+        result = await db.execute(select(models.GroupMember).where(
             and_(
                 models.GroupMember.group_id == message.group_id,
                 models.GroupMember.user_id == current_user.id
             )
-        ).first()
+        ))
+        group_member: Optional[models.GroupMember] = result.scalars().first()
         
         if not group_member:
             raise HTTPException(
@@ -46,7 +54,7 @@ async def send_message(
     
     # If sending to individual, verify recipient exists
     if message.recipient_id:
-        recipient: Optional[models.User] = db.query(models.User).filter(models.User.id == message.recipient_id).first()
+        recipient: Optional[models.User] = await db.get(models.User, message.recipient_id)
         if not recipient:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -63,50 +71,144 @@ async def send_message(
         is_group_message=message.is_group_message or bool(message.group_id)
     )
     
+    # Everyone who can see the message: group members, or both ends of a DM
+    if message.group_id:
+        result = await db.execute(select(models.GroupMember.user_id).where(
+            models.GroupMember.group_id == message.group_id
+        ))
+        audience = list(result.scalars().all())
+    else:
+        audience = [message.recipient_id, current_user.id]
+    
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    await db.flush()
+    await conversations.record_message(db, db_message, audience)
+    await db.commit()
+    await db.refresh(db_message)
+    
+    # Push to connected clients (including the sender's other devices)
+    message_hub.publish(audience, {
+        "type": "message",
+        "message": schemas.Message.model_validate(db_message).model_dump(mode="json"),
+    })
     
     return db_message
 
+@router.websocket("/ws")
+async def message_stream(websocket: WebSocket, token: str = Query(...)):
+    """Push new messages to the authenticated user as they are sent.
+
+    Browsers cannot set headers on WebSocket requests, so the JWT is passed
+    as the ``token`` query parameter. Slow consumers are disconnected with
+    code 1013 and should reconnect and refetch through the REST listings.
+    """
+    try:
+        token_data = decode_access_token(token)
+        async with AsyncSessionLocal() as db:
+            user = await get_current_user(db=db, token_data=token_data)
+        if not user.is_active:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        user_id: int = user.id  # type: ignore
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    try:
+        subscription = message_hub.subscribe(user_id)
+    except TooManyConnections:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Too many connections")
+        return
+    
+    await websocket.accept()
+    
+    async def writer():
+        while True:
+            event = await subscription.next_event()
+            if event is None:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Subscriber lagging")
+                return
+            await websocket.send_json(event)
+    
+    async def reader():
+        # Clients only send keepalives; reading also surfaces disconnects.
+        while True:
+            if await websocket.receive_text() == "ping":
+                await websocket.send_json({"type": "pong"})
+    
+    tasks = [asyncio.create_task(writer()), asyncio.create_task(reader())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        message_hub.unsubscribe(subscription)
+
 @router.get("/inbox", response_model=List[schemas.Message])
 async def get_inbox(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from a previous page's X-Next-Cursor header"),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get user's inbox messages."""
-    messages: List[models.Message] = db.query(models.Message).filter(
+    """Get user's inbox messages.
+
+    Pass ``cursor`` to page by keyset; ``skip`` is only applied without one.
+    """
+    stmt = select(models.Message).where(
         models.Message.recipient_id == current_user.id
-    ).order_by(models.Message.created_at.desc()).offset(skip).limit(limit).all()
+    )
+    stmt = apply_keyset(stmt, models.Message, models.Message.created_at, cursor, descending=True)
+    if not cursor:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit))
+    messages: List[models.Message] = list(result.scalars().all())
+    set_next_cursor(response, messages, limit)
     
     return messages
 
 @router.get("/sent", response_model=List[schemas.Message])
 async def get_sent_messages(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from a previous page's X-Next-Cursor header"),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get user's sent messages."""
-    messages: List[models.Message] = db.query(models.Message).filter(
+    """Get user's sent messages.
+
+    Pass ``cursor`` to page by keyset; ``skip`` is only applied without one.
+    """
+    stmt = select(models.Message).where(
         models.Message.sender_id == current_user.id
-    ).order_by(models.Message.created_at.desc()).offset(skip).limit(limit).all()
+    )
+    stmt = apply_keyset(stmt, models.Message, models.Message.created_at, cursor, descending=True)
+    if not cursor:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit))
+    messages: List[models.Message] = list(result.scalars().all())
+    set_next_cursor(response, messages, limit)
     
     return messages
 
 @router.get("/conversation/{user_id}", response_model=List[schemas.Message])
 async def get_conversation(
     user_id: int,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from a previous page's X-Next-Cursor header"),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get conversation between current user and another user."""
-    messages: List[models.Message] = db.query(models.Message).filter(
+    """Get conversation between current user and another user.
+
+    Pass ``cursor`` to page by keyset; ``skip`` is only applied without one.
+    """
+    stmt = select(models.Message).where(
         or_(
             and_(
                 models.Message.sender_id == current_user.id,
@@ -117,18 +219,91 @@ async def get_conversation(
                 models.Message.recipient_id == current_user.id
             )
         )
-    ).order_by(models.Message.created_at.asc()).offset(skip).limit(limit).all()
+    )
+    stmt = apply_keyset(stmt, models.Message, models.Message.created_at, cursor, descending=False)
+    if not cursor:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit))
+    messages: List[models.Message] = list(result.scalars().all())
+    set_next_cursor(response, messages, limit)
     
     return messages
 
+@router.get("/search", response_model=List[schemas.MessageSearchHit])
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from a previous page's X-Next-Cursor header"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Full-text search over messages the current user can see, best match first."""
+    if not q.split():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query must not be blank"
+        )
+    
+    result = await db.execute(build_search_query(q, current_user.id, cursor, limit))  # type: ignore
+    rows = result.all()
+    hits = [
+        schemas.MessageSearchHit(**schemas.Message.model_validate(message).model_dump(), rank=float(rank))
+        for message, rank in rows
+    ]
+    if len(rows) == limit:
+        last_message, last_rank = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last_message.id, rank=float(last_rank))
+    return hits
+
+@router.put("/read", status_code=status.HTTP_202_ACCEPTED)
+async def mark_conversation_read(
+    request: schemas.BulkReadRequest,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Mark everything up to a message (or cursor) in a conversation as read.
+
+    Receipts are coalesced and written in one batch per short window.
+    """
+    if bool(request.peer_user_id) == bool(request.group_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Exactly one of peer_user_id or group_id must be provided"
+        )
+    
+    if request.up_to_message_id is not None:
+        up_to = request.up_to_message_id
+    elif request.cursor:
+        up_to = decode_cursor(request.cursor)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either up_to_message_id or cursor must be provided"
+        )
+    
+    if request.group_id:
+        result = await db.execute(select(models.GroupMember.id).where(
+            models.GroupMember.group_id == request.group_id,
+            models.GroupMember.user_id == current_user.id
+        ))
+        if result.first() is None:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not a member of this group"
+            )
+    
+    read_receipts.submit(current_user.id, up_to, peer_user_id=request.peer_user_id, group_id=request.group_id)  # type: ignore
+    return {"message": "Read receipt accepted"}
+
 @router.put("/{message_id}/read")
 async def mark_message_read(
     message_id: int,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Mark a message as read."""
-    message: Optional[models.Message] = db.query(models.Message).filter(models.Message.id == message_id).first()
+    message: Optional[models.Message] = await db.get(models.Message, message_id)
     if not message:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -143,16 +318,46 @@ async def mark_message_read(
             detail="You can only mark your own messages as read"
         )
     
-    setattr(message, 'status', models.MessageStatus.READ)
-    setattr(message, 'read_at', func.now())
-    db.commit()
+    if message.status != models.MessageStatus.READ:
+        setattr(message, 'status', models.MessageStatus.READ)
+        setattr(message, 'read_at', func.now())
+        await conversations.mark_read(db, current_user.id, conversations.message_key(message), 1, message_id)  # type: ignore
+        await db.commit()
     
     return {"message": "Message marked as read"}
 
+@router.get("/conversations", response_model=List[schemas.ConversationSummary])
+async def get_conversations(
+    limit: int = Query(50, ge=1, le=100),
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the current user's conversations, most recent first, with unread counts."""
+    participant = models.ConversationParticipant
+    result = await db.execute(
+        select(participant)
+        .options(joinedload(participant.conversation).joinedload(models.Conversation.last_message))
+        .where(participant.user_id == current_user.id)
+        .order_by(participant.last_message_at.desc(), participant.id.desc())
+        .limit(limit)
+    )
+    return [
+        schemas.ConversationSummary(
+            conversation_id=row.conversation_id,
+            group_id=row.conversation.group_id,
+            peer_user_id=row.peer_user_id,
+            unread_count=row.unread_count,
+            last_read_message_id=row.last_read_message_id,
+            last_message_at=row.conversation.last_message_at,
+            last_message=row.conversation.last_message,
+        )
+        for row in result.scalars().all()
+    ]
+
 @router.get("/healthcare-providers", response_model=List[schemas.User])
 async def get_healthcare_providers(
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get list of healthcare providers for messaging."""
     user_role: models.UserRole = current_user.role  # type: ignore
@@ -162,12 +367,13 @@ async def get_healthcare_providers(
             detail="Only patients can access healthcare provider list"
         )
     
-    providers: List[models.User] = db.query(models.User).filter(
+    result = await db.execute(select(models.User).where(
         models.User.role.in_([
             models.UserRole.DOCTOR,
             models.UserRole.NURSE,
             models.UserRole.COUNSELOR
         ])
-    ).filter(models.User.is_active == True).all()
+    ).where(models.User.is_active == True))
+    providers: List[models.User] = list(result.scalars().all())
     
     return providers
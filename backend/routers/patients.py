@@ -1,6 +1,8 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from database import get_db
 import models
 import schemas
@@ -10,8 +12,7 @@ router = APIRouter()
 
 @router.get("/profile", response_model=schemas.Patient)
 async def get_patient_profile(
-    current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(get_current_active_user)
 ):
     """Get current patient's profile."""
     user_role: models.UserRole = current_user.role  # type: ignore
@@ -21,7 +22,7 @@ async def get_patient_profile(
             detail="Only patients can access patient profiles"
         )
     
-    patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+    patient: Optional[models.Patient] = current_user.patient_profile
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -34,7 +35,7 @@ async def get_patient_profile(
 async def update_patient_profile(
     patient_update: schemas.PatientCreate,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current patient's profile."""
     user_role: models.UserRole = current_user.role  # type: ignore
@@ -44,7 +45,7 @@ async def update_patient_profile(
             detail="Only patients can update patient profiles"
         )
     
-    patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+    patient: Optional[models.Patient] = current_user.patient_profile
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -55,8 +56,7 @@ async def update_patient_profile(
     for field, value in patient_update.dict(exclude_unset=True).items():
         setattr(patient, field, value)
     
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
     return patient
 
 @router.get("/", response_model=List[schemas.Patient])
@@ -64,20 +64,25 @@ async def get_all_patients(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: models.User = Depends(require_role([models.UserRole.DOCTOR, models.UserRole.NURSE, models.UserRole.ADMIN])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all patients (staff only)."""
-    patients: List[models.Patient] = db.query(models.Patient).offset(skip).limit(limit).all()
+    result = await db.execute(
+        select(models.Patient).options(selectinload(models.Patient.user)).offset(skip).limit(limit)
+    )
+    patients: List[models.Patient] = list(result.scalars().all())
     return patients
 
 @router.get("/{patient_id}", response_model=schemas.Patient)
 async def get_patient_by_id(
     patient_id: int,
     current_user: models.User = Depends(require_role([models.UserRole.DOCTOR, models.UserRole.NURSE, models.UserRole.ADMIN])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get patient by ID (staff only)."""
-    patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    patient: Optional[models.Patient] = await db.get(
+        models.Patient, patient_id, options=[selectinload(models.Patient.user)]
+    )
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,6 +1,8 @@
 from typing import List, Optional, Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from database import get_db
 import models
 import schemas
@@ -10,8 +12,7 @@ router = APIRouter()
 
 @router.get("/profile", response_model=schemas.Staff)
 async def get_staff_profile(
-    current_user: Annotated[models.User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db)
+    current_user: Annotated[models.User, Depends(get_current_active_user)]
 ):
     """Get current staff member's profile."""
     user_role: models.UserRole = current_user.role  # type: ignore
@@ -21,7 +22,7 @@ async def get_staff_profile(
             detail="Only staff members can access staff profiles"
         )
     
-    staff: Optional[models.Staff] = db.query(models.Staff).filter(models.Staff.user_id == current_user.id).first()
+    staff: Optional[models.Staff] = current_user.staff_profile
     if not staff:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -34,7 +35,7 @@ async def get_staff_profile(
 async def update_staff_profile(
     staff_update: schemas.StaffUpdate,
     current_user: Annotated[models.User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current staff member's profile."""
     user_role: models.UserRole = current_user.role  # type: ignore
@@ -44,7 +45,7 @@ async def update_staff_profile(
             detail="Only staff members can update staff profiles"
         )
     
-    staff: Optional[models.Staff] = db.query(models.Staff).filter(models.Staff.user_id == current_user.id).first()
+    staff: Optional[models.Staff] = current_user.staff_profile
     if not staff:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -55,27 +56,29 @@ async def update_staff_profile(
     for field, value in staff_update.dict(exclude_unset=True).items():
         setattr(staff, field, value)
     
-    db.commit()
-    db.refresh(staff)
+    await db.commit()
     return staff
 
 @router.get("/", response_model=List[schemas.Staff])
 async def get_all_staff(
     current_user: Annotated[models.User, Depends(require_role([models.UserRole.ADMIN]))],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all staff members (admin only)."""
-    staff_list: List[models.Staff] = db.query(models.Staff).all()
+    result = await db.execute(select(models.Staff).options(selectinload(models.Staff.user)))
+    staff_list: List[models.Staff] = list(result.scalars().all())
     return staff_list
 
 @router.get("/{staff_id}", response_model=schemas.Staff)
 async def get_staff_by_id(
     staff_id: int,
     current_user: Annotated[models.User, Depends(require_role([models.UserRole.ADMIN, models.UserRole.DOCTOR]))],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get staff member by ID (admin and doctors only)."""
-    staff: Optional[models.Staff] = db.query(models.Staff).filter(models.Staff.id == staff_id).first()
+    staff: Optional[models.Staff] = await db.get(
+        models.Staff, staff_id, options=[selectinload(models.Staff.user)]
+    )
     if not staff:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
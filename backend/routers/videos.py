@@ -1,92 +1,193 @@
 import os
-import aiofiles
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response, status, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 import models
 import schemas
 from auth import get_current_active_user, require_role
-from config import settings
+from media_uploads import StoredUpload, stream_upload
+import resumable_uploads
+import blob_store
+import storage_usage
+from pagination import apply_keyset, set_next_cursor
+from media_processing import media_processor
+from storage import storage
 
 router = APIRouter()
 
-@router.post("/upload", response_model=schemas.VideoRecording)
-async def upload_video(
-    title: str = Form(...),
-    description: Optional[str] = Form(None),
-    video_file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """Upload a video recording."""
+def _uploading_patient(current_user: models.User) -> models.Patient:
+    """Return the patient profile of a user allowed to upload videos."""
     # Type assertion to help the type checker understand the enum comparison
-    user_role: models.UserRole = current_user.role  # type: ignore  # type: ignore
+    user_role: models.UserRole = current_user.role  # type: ignore
     if user_role != models.UserRole.PATIENT:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only patients can upload videos"
         )
     
-    # Get patient profile
-    patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+    patient: Optional[models.Patient] = current_user.patient_profile
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient profile not found"
         )
-    
-    # Validate file type
-    if not video_file.content_type or not video_file.content_type.startswith('video/'):
+    return patient
+
+def _require_video_type(content_type: Optional[str]) -> None:
+    if not content_type or not content_type.startswith('video/'):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File must be a video"
         )
-    
-    # Read content and check file size
-    content = await video_file.read()
-    if len(content) > settings.max_file_size:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File size exceeds maximum limit of {settings.max_file_size} bytes"
-        )
-    
-    # Create upload directory if it doesn't exist
-    upload_dir = os.path.join(settings.upload_dir, "videos", str(patient.id))
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate unique filename
-    import uuid
-    file_extension = os.path.splitext(video_file.filename or "")[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(upload_dir, unique_filename)
-    
-    # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
-    
-    # Create database record
+
+async def _save_recording(
+    db: AsyncSession,
+    patient_id: int,
+    title: Optional[str],
+    description: Optional[str],
+    staged: StoredUpload,
+    extension: str,
+    content_type: Optional[str]
+) -> models.VideoRecording:
+    """File a staged upload in the blob store and create its recording."""
+    try:
+        await storage_usage.reserve(db, patient_id, staged.size)
+    except HTTPException:
+        os.remove(staged.path)
+        raise
+    file_path, reused = await blob_store.store(db, staged, extension, content_type)
     db_video = models.VideoRecording(
-        patient_id=patient.id,
+        patient_id=patient_id,
         title=title,
         description=description,
         file_path=file_path,
-        file_size_bytes=len(content)
+        file_size_bytes=staged.size,
+        content_sha256=staged.sha256
     )
     
-    db.add(db_video)
-    db.commit()
-    db.refresh(db_video)
+    if reused:
+        # Same content was processed before; copy the results instead of decoding again.
+        result = await db.execute(select(models.VideoRecording).where(
+            models.VideoRecording.content_sha256 == staged.sha256,
+            models.VideoRecording.processing_status == models.MediaProcessingStatus.READY
+        ).limit(1))
+        processed: Optional[models.VideoRecording] = result.scalars().first()
+        if processed:
+            db_video.processing_status = models.MediaProcessingStatus.READY
+            db_video.duration_seconds = processed.duration_seconds
+            db_video.poster_path = processed.poster_path
+            db_video.thumbnail_path = processed.thumbnail_path
     
+    db.add(db_video)
+    await db.commit()
+    await db.refresh(db_video)
+    if db_video.processing_status != models.MediaProcessingStatus.READY:
+        media_processor.submit(db_video.id, db_video.file_path)  # type: ignore
     return db_video
 
+@router.post("/upload", response_model=schemas.VideoRecording)
+async def upload_video(
+    title: str = Form(...),
+    description: Optional[str] = Form(None),
+    video_file: UploadFile = File(...),
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Upload a video recording."""
+    patient = _uploading_patient(current_user)
+    _require_video_type(video_file.content_type)
+    await storage_usage.check_quota(db, patient.id, 0)  # type: ignore
+    
+    # Stream to disk in chunks, enforcing the size limit as data arrives
+    file_extension = os.path.splitext(video_file.filename or "")[1]
+    staged = await stream_upload(video_file, blob_store.STAGING_DIR, file_extension)
+    
+    return await _save_recording(
+        db, patient.id, title, description, staged, file_extension, video_file.content_type  # type: ignore
+    )
+
+@router.post("/uploads", response_model=schemas.UploadSession, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    upload: schemas.UploadSessionCreate,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Start a resumable upload; send chunks with PUT /uploads/{session_id}."""
+    patient = _uploading_patient(current_user)
+    _require_video_type(upload.content_type)
+    await storage_usage.check_quota(db, patient.id, upload.total_size)  # type: ignore
+    meta = resumable_uploads.create_session(current_user.id, patient.id, upload)  # type: ignore
+    return meta.to_schema()
+
+@router.head("/uploads/{session_id}")
+async def get_upload_offset_head(
+    session_id: str,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Report the stored offset in the Upload-Offset header."""
+    meta = resumable_uploads.get_session(session_id, current_user.id)  # type: ignore
+    return Response(headers={
+        "Upload-Offset": str(meta.offset()),
+        "Upload-Length": str(meta.total_size),
+        "Cache-Control": "no-store"
+    })
+
+@router.get("/uploads/{session_id}", response_model=schemas.UploadSession)
+async def get_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Get the stored offset of a resumable upload."""
+    meta = resumable_uploads.get_session(session_id, current_user.id)  # type: ignore
+    return meta.to_schema()
+
+@router.put("/uploads/{session_id}", response_model=schemas.UploadSession)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Append the request body at Upload-Offset (must equal the stored offset)."""
+    meta = resumable_uploads.get_session(session_id, current_user.id)  # type: ignore
+    await resumable_uploads.append_chunk(meta, upload_offset, request.stream())
+    return meta.to_schema()
+
+@router.post("/uploads/{session_id}/complete", response_model=schemas.VideoRecording)
+async def complete_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Finish a resumable upload and create the video recording."""
+    meta = resumable_uploads.get_session(session_id, current_user.id)  # type: ignore
+    staged = await resumable_uploads.complete_session(meta, blob_store.STAGING_DIR)
+    file_extension = os.path.splitext(meta.filename or "")[1]
+    return await _save_recording(
+        db, meta.patient_id, meta.title, meta.description, staged, file_extension, meta.content_type
+    )
+
+@router.delete("/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Abandon a resumable upload and discard its data."""
+    meta = resumable_uploads.get_session(session_id, current_user.id)  # type: ignore
+    resumable_uploads.discard_session(meta)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @router.get("/my-videos", response_model=List[schemas.VideoRecording])
 async def get_my_videos(
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from a previous page's X-Next-Cursor header"),
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get current patient's video recordings."""
+    """Get current patient's video recordings, newest first."""
     user_role: models.UserRole = current_user.role  # type: ignore
     if user_role != models.UserRole.PATIENT:
         raise HTTPException(
@@ -94,24 +195,52 @@ async def get_my_videos(
             detail="Only patients can access their videos"
         )
     
-    patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+    patient: Optional[models.Patient] = current_user.patient_profile
     if not patient:
         return []
     
-    videos: List[models.VideoRecording] = db.query(models.VideoRecording).filter(
+    stmt = select(models.VideoRecording).where(
         models.VideoRecording.patient_id == patient.id
-    ).order_by(models.VideoRecording.recorded_at.desc()).all()
+    )
+    stmt = apply_keyset(stmt, models.VideoRecording, models.VideoRecording.recorded_at, cursor, descending=True)
+    result = await db.execute(stmt.limit(limit))
+    videos: List[models.VideoRecording] = list(result.scalars().all())
+    set_next_cursor(response, videos, limit)
     
     return videos
 
-@router.get("/{video_id}/download")
-async def download_video(
-    video_id: int,
+@router.get("/my-usage", response_model=schemas.StorageUsage)
+async def get_my_storage_usage(
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Download a video recording."""
-    video: Optional[models.VideoRecording] = db.query(models.VideoRecording).filter(models.VideoRecording.id == video_id).first()
+    """Get the current patient's recording count, bytes used and quota."""
+    patient = _uploading_patient(current_user)
+    return await storage_usage.get_usage(db, patient.id)  # type: ignore
+
+@router.get("/usage/{patient_id}", response_model=schemas.StorageUsage)
+async def get_patient_storage_usage(
+    patient_id: int,
+    current_user: models.User = Depends(require_role([models.UserRole.DOCTOR, models.UserRole.NURSE, models.UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a patient's recording count, bytes used and quota."""
+    patient = await db.get(models.Patient, patient_id)
+    if not patient:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Patient not found"
+        )
+    return await storage_usage.get_usage(db, patient_id)
+
+async def _get_video(
+    db: AsyncSession,
+    video_id: int,
+    current_user: models.User,
+    action: str = "access"
+) -> models.VideoRecording:
+    """Load a video, checking that a patient only reaches their own."""
+    video: Optional[models.VideoRecording] = await db.get(models.VideoRecording, video_id)
     if not video:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -121,60 +250,105 @@ async def download_video(
     # Check permissions
     user_role: models.UserRole = current_user.role  # type: ignore
     if user_role == models.UserRole.PATIENT:
-        patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
+        patient: Optional[models.Patient] = current_user.patient_profile
         patient_id: int = video.patient_id  # type: ignore
         if not patient or patient_id != patient.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized to access this video"
+                detail=f"Not authorized to {action} this video"
             )
+    return video
+
+@router.get("/{video_id}/download")
+async def download_video(
+    video_id: int,
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Download a video recording."""
+    video = await _get_video(db, video_id, current_user)
     
-    # Get the actual file path value
+    # Storage key of the video file
     file_path: str = video.file_path  # type: ignore
-    if not os.path.exists(file_path):
+    if not await storage.exists(file_path):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Video file not found on server"
         )
     
-    return FileResponse(
-        path=file_path,
-        filename=f"{video.title}.mp4",
-        media_type='video/mp4'
+    return await storage.download_response(
+        request,
+        file_path,
+        media_type='video/mp4',
+        filename=f"{video.title}.mp4"
     )
 
+async def _image_response(request: Request, image_path: Optional[str]) -> Response:
+    if not image_path or not await storage.exists(image_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not available yet"
+        )
+    response = await storage.download_response(request, image_path, media_type='image/jpeg')
+    if storage.local_path(image_path):
+        # Redirects carry their own short-lived URL and must not be cached this long.
+        response.headers["Cache-Control"] = "private, max-age=86400"
+    return response
+
+@router.get("/{video_id}/poster")
+async def get_video_poster(
+    video_id: int,
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Poster frame of a processed video."""
+    video = await _get_video(db, video_id, current_user)
+    return await _image_response(request, video.poster_path)  # type: ignore
+
+@router.get("/{video_id}/thumbnails")
+async def get_video_thumbnails(
+    video_id: int,
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Horizontal strip of evenly spaced thumbnails of a processed video."""
+    video = await _get_video(db, video_id, current_user)
+    return await _image_response(request, video.thumbnail_path)  # type: ignore
+
 @router.delete("/{video_id}")
 async def delete_video(
     video_id: int,
     current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a video recording."""
-    video: Optional[models.VideoRecording] = db.query(models.VideoRecording).filter(models.VideoRecording.id == video_id).first()
-    if not video:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Video not found"
-        )
+    video = await _get_video(db, video_id, current_user, action="delete")
+    file_path: str = video.file_path  # type: ignore
+    content_sha256: Optional[str] = video.content_sha256  # type: ignore
     
-    # Check permissions
-    user_role: models.UserRole = current_user.role  # type: ignore
-    if user_role == models.UserRole.PATIENT:
-        patient: Optional[models.Patient] = db.query(models.Patient).filter(models.Patient.user_id == current_user.id).first()
-        patient_id: int = video.patient_id  # type: ignore
-        if not patient or patient_id != patient.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized to delete this video"
-            )
+    if video.patient_id is not None:
+        await storage_usage.release(db, video.patient_id, video.file_size_bytes or 0)  # type: ignore
     
-    # Delete file from filesystem
-    file_path: str = video.file_path  # type: ignore
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Shared blobs are only unlinked once their last recording is gone
+    released_blob = None
+    if content_sha256 and blob_store.is_blob_path(file_path):
+        released_blob = await blob_store.release(db, content_sha256)
+        legacy_files = []
+    else:
+        legacy_files = [file_path, video.poster_path, video.thumbnail_path]
     
     # Delete database record
-    db.delete(video)
-    db.commit()
+    await db.delete(video)
+    await db.commit()
+    
+    # Delete files from storage
+    if released_blob:
+        await blob_store.unlink_if_unreferenced(db, content_sha256, released_blob)  # type: ignore
+    for path in legacy_files:
+        if path:
+            await storage.delete(path)  # type: ignore
     
     return {"message": "Video deleted successfully"}
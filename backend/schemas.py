@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from models import UserRole, AppointmentStatus, MessageStatus
+from models import UserRole, AppointmentStatus, MessageStatus, MediaProcessingStatus
 
 # User Schemas
 class UserBase(BaseModel):
@@ -60,6 +60,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    expires_at: Optional[datetime] = None
 
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -110,6 +111,27 @@ class Message(MessageBase):
     class Config:
         from_attributes = True
 
+class MessageSearchHit(Message):
+    rank: float
+
+class BulkReadRequest(BaseModel):
+    peer_user_id: Optional[int] = Field(None, description="Other side of a direct conversation")
+    group_id: Optional[int] = None
+    up_to_message_id: Optional[int] = None
+    cursor: Optional[str] = Field(None, description="Pagination cursor; marks up to its anchor message")
+
+class ConversationSummary(BaseModel):
+    conversation_id: int
+    group_id: Optional[int] = None
+    peer_user_id: Optional[int] = None
+    unread_count: int
+    last_read_message_id: Optional[int] = None
+    last_message_at: Optional[datetime] = None
+    last_message: Optional[Message] = None
+    
+    class Config:
+        from_attributes = True
+
 # Medication Log Schemas
 class MedicationLogBase(BaseModel):
     medication_name: str
@@ -142,11 +164,33 @@ class VideoRecording(VideoRecordingBase):
     file_path: str
     duration_seconds: Optional[int] = None
     file_size_bytes: Optional[int] = None
+    content_sha256: Optional[str] = None
+    processing_status: Optional[MediaProcessingStatus] = None
+    has_poster: bool = False
+    has_thumbnails: bool = False
     recorded_at: datetime
     
     class Config:
         from_attributes = True
 
+class StorageUsage(BaseModel):
+    patient_id: int
+    video_count: int
+    total_bytes: int
+    quota_bytes: Optional[int] = None
+    updated_at: Optional[datetime] = None
+
+class UploadSessionCreate(VideoRecordingBase):
+    filename: Optional[str] = None
+    content_type: str
+    total_size: int = Field(..., gt=0)
+
+class UploadSession(BaseModel):
+    id: str
+    offset: int
+    total_size: int
+    expires_at: datetime
+
 # Activity Log Schemas
 class ActivityLogBase(BaseModel):
     activity_type: str
@@ -280,6 +324,9 @@ class FaceEncodingResponse(FaceEncodingBase):
     class Config:
         from_attributes = True
 
+class FaceEnrollmentRequest(FaceEncodingCreate):
+    image_data: str  # Base64 encoded image with exactly one face
+
 class FaceVerificationRequest(BaseModel):
     image_data: str  # Base64 encoded image
     user_id: Optional[int] = None
@@ -292,6 +339,12 @@ class FaceVerificationResponse(BaseModel):
     matched_patient_id: Optional[int] = None
     message: str
 
+class FaceBatchVerificationRequest(BaseModel):
+    items: List[FaceVerificationRequest] = Field(..., min_length=1)
+
+class FaceBatchVerificationResponse(BaseModel):
+    results: List[FaceVerificationResponse]
+
 class FaceMatchRequest(BaseModel):
     image_data: str  # Base64 encoded image
     threshold: float = 0.6  # Matching threshold (0.0 to 1.0)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Recall/latency benchmark of the IVF face index against exact search.
+Encodings are synthetic: 128-d vectors grouped around one centre per
+person, like repeated enrollments of the same face. Queries are fresh
+samples of enrolled people. Recall is the share of the exact matches
+within the threshold (FaceMatcher's brute-force scan) that the index
+also returns.
+
+    python scripts/benchmark_face_index.py --size 100000 --nprobe 4 8 16 32
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from face_index import IVFIndex
+from face_matching import FaceMatcher
+
+
+def synthetic_encodings(size: int, per_person: int, dimensions: int, rng: np.random.Generator):
+    people = max(1, size // per_person)
+    # Scaled so the same person is ~0.4 apart and different people ~1.0,
+    # roughly what face_recognition's 128-d encodings show.
+    centres = rng.normal(scale=0.06, size=(people, dimensions)).astype(np.float32)
+    owners = rng.integers(0, people, size)
+    vectors = centres[owners] + rng.normal(scale=0.018, size=(size, dimensions)).astype(np.float32)
+    return centres, vectors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the IVF face index against exact search")
+    parser.add_argument("--size", type=int, default=50000, help="Enrolled encodings")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--per-person", type=int, default=3, help="Encodings per synthetic person")
+    parser.add_argument("--dimensions", type=int, default=128)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--nlist", type=int, default=None, help="Lists (default: sqrt(size))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centres, vectors = synthetic_encodings(args.size, args.per_person, args.dimensions, rng)
+    ids = np.arange(args.size, dtype=np.int64)
+    picked = rng.integers(0, len(centres), args.queries)
+    queries = centres[picked] + rng.normal(scale=0.018, size=(args.queries, args.dimensions)).astype(np.float32)
+
+    exact = FaceMatcher(initial_capacity=args.size)
+    exact.load([(int(i), int(i), None, v) for i, v in zip(ids, vectors)])
+    # One query at a time, as a kiosk sends them.
+    started = time.perf_counter()
+    truth = [exact.match(query, threshold=args.threshold, k=args.k) for query in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / args.queries
+    truth_ids = [{m.encoding_id for m in matches} for matches in truth]
+
+    started = time.perf_counter()
+    index = IVFIndex.build(ids, vectors, nlist=args.nlist)
+    build_s = time.perf_counter() - started
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "face_index.npz")
+        started = time.perf_counter()
+        index.save(path)
+        save_s = time.perf_counter() - started
+        started = time.perf_counter()
+        index = IVFIndex.load(path)
+        load_s = time.perf_counter() - started
+        size_mb = os.path.getsize(path) / 1e6
+
+    matched = np.mean([len(t) for t in truth_ids])
+    print(f"{args.size} encodings x {args.dimensions}d, {index.nlist} lists, k={args.k}, "
+          f"{args.queries} queries, {matched:.1f} exact matches/query within {args.threshold}")
+    print(f"build {build_s:.2f}s  save {save_s:.2f}s  load {load_s:.2f}s  file {size_mb:.1f} MB")
+    print(f"exact      {exact_ms:8.3f} ms/query  recall 1.000")
+    for nprobe in args.nprobe:
+        started = time.perf_counter()
+        found = [index.search(query, args.k, nprobe=nprobe)[0] for query in queries]
+        ivf_ms = (time.perf_counter() - started) * 1000 / args.queries
+        recall = np.mean([
+            len(truth & set(result[distances <= args.threshold].tolist())) / len(truth)
+            for truth, (result, distances) in zip(truth_ids, found)
+            if truth
+        ])
+        print(f"nprobe={nprobe:<4d}{ivf_ms:8.3f} ms/query  recall {recall:.3f}  speedup {exact_ms / ivf_ms:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
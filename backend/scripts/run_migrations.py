@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 """
 Database migration runner for Serenity Rehabilitation Center
-Run this script to set up the database schema and seed data
+Run this script to set up the database schema.
+Applied files are recorded in the schema_migrations ledger, so re-running
+only executes migrations added since the last run. A database created by
+the app's old create_all startup is brought under the ledger once with
+--baseline 000_baseline_schema.sql.
 """
 
 import os
 import sys
 import logging
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -25,6 +30,7 @@ backend_dir = Path(__file__).parent.parent
 sys.path.append(str(backend_dir))
 
 from config import settings
+from migration_ledger import LEDGER_DDL, Migration, diff_ledger, discover_migrations
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -92,8 +98,37 @@ def create_database_if_not_exists() -> bool:
         logger.error(f"Error creating database: {str(e)}")
         return False
 
-def run_migrations() -> bool:
-    """Run all migration scripts"""
+def load_ledger(connection) -> dict:
+    """Create the ledger table if needed and return ``{filename: checksum}``"""
+    cursor = connection.cursor()
+    cursor.execute(LEDGER_DDL)
+    cursor.execute("SELECT filename, checksum FROM schema_migrations")
+    applied = {filename: checksum.strip() for filename, checksum in cursor.fetchall()}
+    connection.commit()
+    cursor.close()
+    return applied
+
+def apply_migration(connection, migration: Migration) -> bool:
+    """Execute one migration file and record it in the ledger in the same transaction"""
+    try:
+        cursor = connection.cursor()
+        started = time.monotonic()
+        cursor.execute(migration.read())
+        cursor.execute(
+            "INSERT INTO schema_migrations (filename, checksum, execution_ms) VALUES (%s, %s, %s)",
+            (migration.filename, migration.checksum, int((time.monotonic() - started) * 1000))
+        )
+        connection.commit()
+        cursor.close()
+        logger.info(f"Applied migration {migration.filename}")
+        return True
+    except Exception as e:
+        logger.error(f"Error executing {migration.filename}: {str(e)}")
+        connection.rollback()
+        return False
+
+def run_migrations(baseline: Optional[str] = None, status_only: bool = False) -> bool:
+    """Apply every migration that is not yet recorded in the ledger"""
     if not PSYCOPG2_AVAILABLE:
         logger.error("psycopg2 is required for database operations")
         return False
@@ -103,27 +138,57 @@ def run_migrations() -> bool:
         if not create_database_if_not_exists():
             return False
         
-        # Connect to the application database
         connection = psycopg2.connect(settings.database_url)
+        migrations = discover_migrations()
+        applied = load_ledger(connection)
+        pending, changed = diff_ledger(migrations, applied)
+        
+        for migration in changed:
+            logger.error(
+                f"Checksum mismatch for applied migration {migration.filename}; "
+                "add a new migration instead of editing an applied one"
+            )
+        if changed:
+            connection.close()
+            return False
         
-        # Get migration files directory
-        migrations_dir = backend_dir / 'migrations'
-        
-        # Run migration files in order
-        migration_files = [
-            '001_initial_schema.sql',
-            '002_seed_data.sql'
-        ]
-        
-        for migration_file in migration_files:
-            file_path = migrations_dir / migration_file
-            if file_path.exists():
-                logger.info(f"Running migration: {migration_file}")
-                if not run_sql_file(connection, file_path):
-                    logger.error(f"Migration failed: {migration_file}")
-                    return False
-            else:
-                logger.warning(f"Migration file not found: {file_path}")
+        if status_only:
+            for migration in migrations:
+                state = "pending" if migration in pending else "applied"
+                logger.info(f"{state:8} {migration.filename}")
+            connection.close()
+            return True
+        
+        if baseline:
+            # Databases set up before the ledger existed: record files up to
+            # and including ``baseline`` as applied without running them.
+            names = [m.filename for m in migrations]
+            if baseline not in names:
+                logger.error(f"Unknown baseline migration: {baseline}")
+                connection.close()
+                return False
+            cutoff = names.index(baseline)
+            cursor = connection.cursor()
+            for migration in pending:
+                if names.index(migration.filename) <= cutoff:
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (filename, checksum) VALUES (%s, %s)",
+                        (migration.filename, migration.checksum)
+                    )
+                    logger.info(f"Baselined migration {migration.filename}")
+            connection.commit()
+            cursor.close()
+            pending = [m for m in pending if names.index(m.filename) > cutoff]
+        
+        if not pending:
+            logger.info("Database schema is up to date")
+        
+        for migration in pending:
+            logger.info(f"Running migration: {migration.filename}")
+            if not apply_migration(connection, migration):
+                logger.error(f"Migration failed: {migration.filename}")
+                connection.close()
+                return False
         
         connection.close()
         logger.info("All migrations completed successfully!")
@@ -169,6 +234,9 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description='Database migration tool')
     parser.add_argument('--reset', action='store_true', help='Reset database (drops all tables)')
+    parser.add_argument('--status', action='store_true', help='List applied and pending migrations')
+    parser.add_argument('--baseline', metavar='FILENAME',
+                        help='Mark migrations up to FILENAME as applied without running them')
     args = parser.parse_args()
     
     if args.reset:
@@ -180,6 +248,6 @@ if __name__ == "__main__":
             logger.info("Database reset cancelled")
             success = True
     else:
-        success = run_migrations()
+        success = run_migrations(baseline=args.baseline, status_only=args.status)
     
     sys.exit(0 if success else 1)
@@ -0,0 +1,187 @@
+"""Where uploaded media lives.
+
+Media is addressed by a storage key, the relative path stored in
+``VideoRecording.file_path`` (e.g. ``uploads/blobs/ab/cd/<sha256>.mp4``).
+``LocalStorage`` maps keys onto the local filesystem and serves downloads
+itself with byte-range support. ``S3Storage`` keeps objects in an
+S3-compatible bucket (AWS, MinIO, R2, ...): files are sent with boto3's
+multipart transfer manager over a pooled client, and downloads are
+answered with a redirect to a short-lived presigned URL so media bytes
+never pass through API workers. Select the driver with ``STORAGE_BACKEND``.
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import RedirectResponse, Response
+
+import metrics
+from config import settings
+from range_response import content_disposition, file_response
+
+
+class Storage:
+    """Interface implemented by the storage drivers."""
+
+    async def save(self, source_path: str, key: str, content_type: Optional[str] = None) -> None:
+        """Move the local file ``source_path`` into storage under ``key``."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Remove ``key``; missing keys are ignored."""
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of ``key`` if the driver stores it locally."""
+        return None
+
+    async def read_url(self, key: str) -> Optional[str]:
+        """URL a worker process can read ``key`` from, for non-local drivers."""
+        return None
+
+    async def download_response(
+        self, request: Request, key: str, media_type: str, filename: Optional[str] = None
+    ) -> Response:
+        """Response delivering ``key`` to the client (as an attachment if ``filename`` is set)."""
+        raise NotImplementedError
+
+
+class LocalStorage(Storage):
+    async def save(self, source_path: str, key: str, content_type: Optional[str] = None) -> None:
+        os.makedirs(os.path.dirname(key) or ".", exist_ok=True)
+        os.replace(source_path, key)
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.remove(key)
+        except FileNotFoundError:
+            pass
+
+    async def exists(self, key: str) -> bool:
+        return os.path.exists(key)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return key
+
+    async def download_response(
+        self, request: Request, key: str, media_type: str, filename: Optional[str] = None
+    ) -> Response:
+        return file_response(request, key, media_type=media_type, filename=filename)
+
+
+class S3Storage(Storage):
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        presign_ttl_seconds: int = 300,
+        max_pool_connections: int = 20,
+        multipart_chunk_bytes: int = 8 * 1024 * 1024,
+    ):
+        # Imported lazily so boto3 is only needed when this driver is selected.
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.presign_ttl_seconds = presign_ttl_seconds
+        # boto3 clients are thread-safe; one client shares its connection pool
+        # across every transfer thread.
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={"max_attempts": 5, "mode": "adaptive"},
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+            ),
+        )
+        self._transfer_config = TransferConfig(
+            multipart_threshold=multipart_chunk_bytes,
+            multipart_chunksize=multipart_chunk_bytes,
+            max_concurrency=min(8, max_pool_connections),
+        )
+        self._not_found_codes = {"404", "NoSuchKey", "NotFound"}
+
+    @staticmethod
+    def _object_key(key: str) -> str:
+        return key.lstrip("/")
+
+    async def save(self, source_path: str, key: str, content_type: Optional[str] = None) -> None:
+        extra_args = {"ContentType": content_type} if content_type else None
+        await asyncio.to_thread(
+            self._client.upload_file,
+            source_path,
+            self.bucket,
+            self._object_key(key),
+            ExtraArgs=extra_args,
+            Config=self._transfer_config,
+        )
+        metrics.counter("storage.s3_uploaded_bytes").inc(os.path.getsize(source_path))
+        os.remove(source_path)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._client.delete_object, Bucket=self.bucket, Key=self._object_key(key))
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await asyncio.to_thread(self._client.head_object, Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in self._not_found_codes:
+                return False
+            raise
+
+    def _presign(self, key: str, media_type: Optional[str] = None, filename: Optional[str] = None) -> str:
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if media_type:
+            params["ResponseContentType"] = media_type
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition(filename)
+        # Presigning is a local HMAC computation; no network round trip.
+        return self._client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.presign_ttl_seconds)
+
+    async def read_url(self, key: str) -> Optional[str]:
+        return self._presign(key)
+
+    async def download_response(
+        self, request: Request, key: str, media_type: str, filename: Optional[str] = None
+    ) -> Response:
+        metrics.counter("storage.s3_redirects").inc()
+        # The object store answers Range requests itself.
+        return RedirectResponse(
+            self._presign(key, media_type, filename),
+            status_code=307,
+            headers={"Cache-Control": "private, no-store"},
+        )
+
+
+def create_storage() -> Storage:
+    if settings.storage_backend == "s3":
+        return S3Storage(
+            bucket=settings.s3_bucket,
+            endpoint_url=settings.s3_endpoint_url,
+            region=settings.s3_region,
+            access_key_id=settings.s3_access_key_id,
+            secret_access_key=settings.s3_secret_access_key,
+            presign_ttl_seconds=settings.s3_presign_ttl_seconds,
+            max_pool_connections=settings.s3_max_pool_connections,
+            multipart_chunk_bytes=settings.s3_multipart_chunk_mb * 1024 * 1024,
+        )
+    return LocalStorage()
+
+
+storage = create_storage()
@@ -0,0 +1,110 @@
+"""Per-patient storage usage counters and quota checks.
+
+``patient_storage_usage`` holds each patient's recording count and total
+bytes. The counters change in the same transaction that adds or deletes
+a recording, so reading usage or checking the quota is a primary-key
+lookup instead of a ``SUM`` over ``video_recordings``. Bytes are counted
+per recording even when the blob store shares one copy between several:
+the quota covers what a patient uploaded, not what the disk holds.
+A patient without a row yet is seeded from their recordings once.
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import metrics
+import models
+import schemas
+from config import settings
+
+
+def _quota() -> Optional[int]:
+    return settings.patient_storage_quota_bytes or None
+
+
+def _quota_exceeded() -> HTTPException:
+    metrics.counter("storage_usage.quota_rejections").inc()
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Storage quota of {settings.patient_storage_quota_bytes} bytes exceeded"
+    )
+
+
+async def _usage_row(db: AsyncSession, patient_id: int) -> models.PatientStorageUsage:
+    usage = await db.get(models.PatientStorageUsage, patient_id)
+    if usage is not None:
+        return usage
+
+    recordings = models.VideoRecording
+    count, total = (await db.execute(
+        select(func.count(recordings.id), func.coalesce(func.sum(recordings.file_size_bytes), 0))
+        .where(recordings.patient_id == patient_id)
+    )).one()
+    usage = models.PatientStorageUsage(patient_id=patient_id, video_count=count, total_bytes=total)
+    try:
+        async with db.begin_nested():
+            db.add(usage)
+    except IntegrityError:
+        # Seeded concurrently by another request.
+        usage = await db.get(models.PatientStorageUsage, patient_id, populate_existing=True)
+    return usage  # type: ignore[return-value]
+
+
+async def get_usage(db: AsyncSession, patient_id: int) -> schemas.StorageUsage:
+    usage = await _usage_row(db, patient_id)
+    await db.commit()
+    await db.refresh(usage)
+    return schemas.StorageUsage(
+        patient_id=patient_id,
+        video_count=usage.video_count,  # type: ignore[arg-type]
+        total_bytes=usage.total_bytes,  # type: ignore[arg-type]
+        quota_bytes=_quota(),
+        updated_at=usage.updated_at,  # type: ignore[arg-type]
+    )
+
+
+async def check_quota(db: AsyncSession, patient_id: int, size: int) -> None:
+    """Refuse early if ``size`` more bytes cannot fit; the binding check is ``reserve``."""
+    quota = _quota()
+    if quota is None:
+        return
+    usage = await _usage_row(db, patient_id)
+    if usage.total_bytes >= quota or usage.total_bytes + size > quota:  # type: ignore[operator]
+        raise _quota_exceeded()
+
+
+async def reserve(db: AsyncSession, patient_id: int, size: int) -> None:
+    """Count a new recording of ``size`` bytes, or raise 413 if it would exceed the quota.
+
+    The conditional update locks the patient's row until the caller
+    commits, so concurrent uploads cannot overshoot the quota together.
+    """
+    await _usage_row(db, patient_id)
+    usage = models.PatientStorageUsage
+    stmt = update(usage).where(usage.patient_id == patient_id)
+    quota = _quota()
+    if quota is not None:
+        stmt = stmt.where(usage.total_bytes + size <= quota)
+    result = await db.execute(
+        stmt.values(video_count=usage.video_count + 1, total_bytes=usage.total_bytes + size)
+        .returning(usage.total_bytes)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar() is None:
+        raise _quota_exceeded()
+
+
+async def release(db: AsyncSession, patient_id: int, size: int) -> None:
+    """Uncount a deleted recording of ``size`` bytes."""
+    await _usage_row(db, patient_id)
+    usage = models.PatientStorageUsage
+    await db.execute(
+        update(usage)
+        .where(usage.patient_id == patient_id)
+        .values(video_count=usage.video_count - 1, total_bytes=usage.total_bytes - size)
+        .execution_options(synchronize_session=False)
+    )
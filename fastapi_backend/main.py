@@ -1,19 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
+import re
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Literal, Optional, Tuple
 from uuid import uuid4
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Header, status
+import anyio
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Header, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from .models import Video
+from .models import UploadResponse, Video
+from .storage import create_storage
+from .video_index import InvalidCursor, VideoIndex
+
+logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+INDEX_PATH = Path(os.getenv("VIDEO_INDEX_PATH", "video_index.sqlite3"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 
 app = FastAPI()
 
@@ -25,34 +38,44 @@ app.add_middleware(
     allow_origins=allow_origins,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
-# Serve uploaded files
+# Serve uploaded files (local storage; S3 downloads use presigned URLs)
 app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+storage = create_storage(UPLOAD_DIR)
+
 
-# In-memory metadata store
-videos: List[Dict[str, object]] = []
+async def _reconcile_index(index: VideoIndex) -> None:
+    try:
+        stats = await asyncio.to_thread(index.reconcile)
+        logger.info("Video index reconciled: %s", stats)
+    except Exception:
+        logger.exception("Video index reconcile failed")
 
 
 @app.on_event("startup")
 async def load_existing_videos() -> None:
-    """Populate the in-memory list from existing files."""
-    videos.clear()
-    for file in UPLOAD_DIR.iterdir():
-        if file.is_file():
-            stat = file.stat()
-            videos.append(
-                {
-                    "id": str(uuid4()),
-                    "filename": file.name,
-                    "size": stat.st_size,
-                    "uploadedAt": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
-                }
-            )
+    """Serve from the stored index right away; sync it with the directory in the background."""
+    # The index lives outside the statically served upload directory.
+    app.state.index = VideoIndex(INDEX_PATH, UPLOAD_DIR)
+    app.state.reconcile_task = None
+    # With remote storage the index itself is the record of what was uploaded.
+    if storage.is_local:
+        app.state.reconcile_task = asyncio.create_task(_reconcile_index(app.state.index))
+
+
+@app.on_event("shutdown")
+async def close_index() -> None:
+    task = app.state.reconcile_task
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    app.state.index.close()
 
 
 def _build_video_response(request: Request, data: Dict[str, object]) -> Video:
-    url = str(request.url_for("uploads", path=data["filename"]))
+    url = storage.url(request, data["filename"])
     return Video(
         id=data["id"],
         filename=data["filename"],
@@ -62,9 +85,49 @@ def _build_video_response(request: Request, data: Dict[str, object]) -> Video:
     )
 
 
-@app.post("/videos/upload", response_model=Dict[str, Video])
+def _unique_name(filename: str | None) -> str:
+    """Safe, collision-free file name that keeps the client's name readable."""
+    name = Path(filename or "video").name
+    stem, suffix = os.path.splitext(name)
+    stem = re.sub(r"[^A-Za-z0-9_-]+", "-", stem).strip("-")[:80] or "video"
+    suffix = re.sub(r"[^A-Za-z0-9.]+", "", suffix)[:10]
+    return f"{stem}-{uuid4().hex[:12]}{suffix}"
+
+
+async def _stream_to_storage(file: UploadFile, name: str) -> Tuple[int, float]:
+    """Copy ``file`` into storage as ``name`` in chunks; returns ``(bytes, seconds)``.
+
+    Data goes to a hidden temp file first and is handed to storage only
+    when complete (a rename for local storage), so readers never see a
+    partial upload.
+    """
+    temp_path = UPLOAD_DIR / f".{name}.part"
+    size = 0
+    started = time.perf_counter()
+    try:
+        async with await anyio.open_file(temp_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                        detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte limit",
+                    )
+                await out.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file")
+        await storage.save(temp_path, name, file.content_type)
+    except OSError as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc)) from exc
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return size, time.perf_counter() - started
+
+
+@app.post("/videos/upload", response_model=UploadResponse)
 async def upload_video(
     request: Request,
+    response: Response,
     file: UploadFile = File(...),
     authorization: str | None = Header(default=None),
 ):
@@ -74,29 +137,37 @@ async def upload_video(
         if scheme.lower() != "bearer" or not token:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file")
-
-    file_path = UPLOAD_DIR / file.filename
-    try:
-        with open(file_path, "wb") as f:
-            f.write(contents)
-    except OSError as exc:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc)) from exc
-
-    video_data = {
-        "id": str(uuid4()),
-        "filename": file.filename,
-        "size": len(contents),
-        "uploadedAt": datetime.now(tz=timezone.utc),
-    }
-    videos.append(video_data)
+    name = _unique_name(file.filename)
+    size, seconds = await _stream_to_storage(file, name)
+    throughput = size / seconds / (1024 * 1024) if seconds > 0 else 0.0
+    logger.info("Stored upload %s: %d bytes in %.3fs (%.1f MiB/s)", name, size, seconds, throughput)
+    response.headers["Server-Timing"] = f'upload;dur={seconds * 1000:.1f};desc="{throughput:.1f} MiB/s"'
+
+    # Reconcile compares local files by (size, mtime_ns), so record the stored
+    # file's own mtime; remote objects are never reconciled.
+    mtime_ns = (UPLOAD_DIR / name).stat().st_mtime_ns if storage.is_local else time.time_ns()
+    video_data = await asyncio.to_thread(
+        request.app.state.index.record, name, size, mtime_ns, datetime.now(tz=timezone.utc)
+    )
 
     video = _build_video_response(request, video_data)
     return {"message": "ok", "video": video}
 
 
 @app.get("/videos/", response_model=List[Video])
-async def list_videos(request: Request) -> List[Video]:
-    return [_build_video_response(request, v) for v in videos]
+def list_videos(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    sort: Literal["uploadedAt", "filename", "size"] = "uploadedAt",
+    order: Literal["asc", "desc"] = "desc",
+    cursor: Optional[str] = None,
+) -> List[Video]:
+    """One page of videos; the next page's cursor is sent in ``X-Next-Cursor``."""
+    try:
+        rows, next_cursor = request.app.state.index.page(limit, sort=sort, descending=order == "desc", cursor=cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [_build_video_response(request, v) for v in rows]
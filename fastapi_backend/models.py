@@ -12,3 +12,10 @@ class Video(BaseModel):
     url: str
     size: int
     uploadedAt: datetime
+
+
+class UploadResponse(BaseModel):
+    """Body returned by ``POST /videos/upload``."""
+
+    message: str
+    video: Video
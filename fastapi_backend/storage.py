@@ -0,0 +1,87 @@
+"""Storage drivers for uploaded videos.
+
+``LocalStorage`` keeps files in the upload directory, which the app serves
+statically. ``S3Storage`` puts them in an S3-compatible bucket (AWS, MinIO,
+R2, ...) using boto3's multipart transfer over one pooled client, and hands
+out presigned URLs so video bytes go straight between client and bucket.
+Chosen with ``STORAGE_BACKEND`` (``local`` or ``s3``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+
+from fastapi import Request
+
+
+class LocalStorage:
+    is_local = True
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    async def save(self, source: Path, name: str, content_type: str | None = None) -> None:
+        os.replace(source, self.root / name)
+
+    def url(self, request: Request, name: str) -> str:
+        return str(request.url_for("uploads", path=name))
+
+
+class S3Storage:
+    is_local = False
+
+    def __init__(self) -> None:
+        # Imported lazily so boto3 is only needed when this driver is selected.
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        endpoint_url = os.getenv("S3_ENDPOINT_URL") or None
+        pool_size = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20"))
+        chunk_bytes = int(os.getenv("S3_MULTIPART_CHUNK_MB", "8")) * 1024 * 1024
+        self.bucket = os.environ["S3_BUCKET"]
+        self.prefix = os.getenv("S3_PREFIX", "videos/")
+        self.presign_ttl = int(os.getenv("S3_PRESIGN_TTL_SECONDS", "3600"))
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=os.getenv("S3_REGION") or None,
+            aws_access_key_id=os.getenv("S3_ACCESS_KEY_ID") or None,
+            aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY") or None,
+            config=Config(
+                max_pool_connections=pool_size,
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+            ),
+        )
+        self._transfer = TransferConfig(
+            multipart_threshold=chunk_bytes,
+            multipart_chunksize=chunk_bytes,
+            max_concurrency=min(8, pool_size),
+        )
+
+    async def save(self, source: Path, name: str, content_type: str | None = None) -> None:
+        await asyncio.to_thread(
+            self._client.upload_file,
+            str(source),
+            self.bucket,
+            self.prefix + name,
+            ExtraArgs={"ContentType": content_type} if content_type else None,
+            Config=self._transfer,
+        )
+        source.unlink(missing_ok=True)
+
+    def url(self, request: Request, name: str) -> str:
+        # Local HMAC signing; no request to the bucket.
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.prefix + name},
+            ExpiresIn=self.presign_ttl,
+        )
+
+
+def create_storage(upload_dir: Path) -> LocalStorage | S3Storage:
+    if os.getenv("STORAGE_BACKEND", "local").lower() == "s3":
+        return S3Storage()
+    return LocalStorage(upload_dir)
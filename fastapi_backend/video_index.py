@@ -0,0 +1,175 @@
+"""SQLite index of uploaded video metadata.
+
+Each file in the upload directory has one row with a stable id assigned
+the first time it is seen. Opening the index is O(1); reconciling it with
+the directory (new, changed and removed files) runs in batches in the
+background, so a directory with tens of thousands of files does not hold
+up startup. Listings are keyset-paginated on ``(<sort column>, id)``.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+SORT_COLUMNS = {"uploadedAt": "uploaded_at", "filename": "filename", "size": "size"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    uploaded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_videos_uploaded_at ON videos(uploaded_at, id);
+CREATE INDEX IF NOT EXISTS ix_videos_size ON videos(size, id);
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value: object, video_id: str) -> str:
+    raw = json.dumps([value, video_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[object, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, video_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    if not isinstance(video_id, str):
+        raise InvalidCursor("Invalid cursor")
+    return value, video_id
+
+
+def _is_video_file(entry: os.DirEntry) -> bool:
+    # Dotfiles are in-progress uploads and other service bookkeeping.
+    return not entry.name.startswith(".") and entry.is_file(follow_symlinks=False)
+
+
+def _timestamp(mtime_ns: int) -> str:
+    return datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc).isoformat()
+
+
+class VideoIndex:
+    def __init__(self, index_path: Path, upload_dir: Path, batch_size: int = 1000):
+        self.upload_dir = upload_dir
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(index_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def record(self, filename: str, size: int, mtime_ns: int, uploaded_at: Optional[datetime] = None) -> Dict[str, object]:
+        """Insert or refresh the row for ``filename``, keeping its id if known."""
+        uploaded = (uploaded_at or datetime.now(tz=timezone.utc)).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO videos (id, filename, size, mtime_ns, uploaded_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(filename) DO UPDATE SET
+                       size = excluded.size, mtime_ns = excluded.mtime_ns, uploaded_at = excluded.uploaded_at""",
+                (str(uuid4()), filename, size, mtime_ns, uploaded),
+            )
+            row = self._conn.execute("SELECT * FROM videos WHERE filename = ?", (filename,)).fetchone()
+        return _to_dict(row)
+
+    def page(
+        self,
+        limit: int,
+        sort: str = "uploadedAt",
+        descending: bool = True,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, object]], Optional[str]]:
+        """Return one page of rows and the cursor for the next one (if any)."""
+        column = SORT_COLUMNS[sort]
+        op, direction = ("<", "DESC") if descending else (">", "ASC")
+        sql = "SELECT * FROM videos"
+        params: list = []
+        if cursor:
+            value, video_id = decode_cursor(cursor)
+            sql += f" WHERE ({column}, id) {op} (?, ?)"
+            params += [value, video_id]
+        sql += f" ORDER BY {column} {direction}, id {direction} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1][column], rows[-1]["id"])
+        return [_to_dict(row) for row in rows], next_cursor
+
+    def reconcile(self) -> Dict[str, int]:
+        """Bring the index in line with the upload directory, one batch at a time."""
+        with self._lock:
+            known = {
+                row["filename"]: (row["size"], row["mtime_ns"])
+                for row in self._conn.execute("SELECT filename, size, mtime_ns FROM videos")
+            }
+        stats = {"added": 0, "updated": 0, "removed": 0}
+        seen = set()
+        batch: List[Tuple[str, int, int]] = []
+
+        def flush() -> None:
+            with self._lock, self._conn:
+                for filename, size, mtime_ns in batch:
+                    if filename in known:
+                        self._conn.execute(
+                            "UPDATE videos SET size = ?, mtime_ns = ? WHERE filename = ?",
+                            (size, mtime_ns, filename),
+                        )
+                        stats["updated"] += 1
+                    else:
+                        self._conn.execute(
+                            "INSERT OR IGNORE INTO videos (id, filename, size, mtime_ns, uploaded_at) VALUES (?, ?, ?, ?, ?)",
+                            (str(uuid4()), filename, size, mtime_ns, _timestamp(mtime_ns)),
+                        )
+                        stats["added"] += 1
+            batch.clear()
+
+        with os.scandir(self.upload_dir) as entries:
+            for entry in entries:
+                if not _is_video_file(entry):
+                    continue
+                seen.add(entry.name)
+                stat = entry.stat(follow_symlinks=False)
+                if known.get(entry.name) != (stat.st_size, stat.st_mtime_ns):
+                    batch.append((entry.name, stat.st_size, stat.st_mtime_ns))
+                    if len(batch) >= self.batch_size:
+                        flush()
+        flush()
+
+        missing = [name for name in known if name not in seen]
+        for start in range(0, len(missing), self.batch_size):
+            chunk = missing[start:start + self.batch_size]
+            with self._lock, self._conn:
+                self._conn.execute(
+                    f"DELETE FROM videos WHERE filename IN ({','.join('?' * len(chunk))})", chunk
+                )
+            stats["removed"] += len(chunk)
+        return stats
+
+
+def _to_dict(row: sqlite3.Row) -> Dict[str, object]:
+    return {
+        "id": row["id"],
+        "filename": row["filename"],
+        "size": row["size"],
+        "uploadedAt": datetime.fromisoformat(row["uploaded_at"]),
+    }